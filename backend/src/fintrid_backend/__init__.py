@@ -5,6 +5,14 @@ Fintrid Backend - Financial Tracking Application
 __version__ = "0.1.0"
 __author__ = "Fintrid Team"
 
-from fintrid_backend.main import app
+__all__ = ["app"]
 
-__all__ = ["app"]
\ No newline at end of file
+
+def __getattr__(name):
+    # Imported lazily so page-pool workers can load fintrid_backend.pdf_layout without
+    # pulling in the whole API.
+    if name == "app":
+        from fintrid_backend.main import app
+
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
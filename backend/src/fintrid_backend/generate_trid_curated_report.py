@@ -1,20 +1,16 @@
 from __future__ import annotations
 
+import html
+from collections import Counter
 from datetime import datetime
-from typing import List, Dict, Any, Optional
-
-from reportlab.lib.pagesizes import LETTER, landscape
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.platypus import (
-    SimpleDocTemplate,
-    Paragraph,
-    Spacer,
-    Table,
-    TableStyle,
-    PageBreak,
-)
-from reportlab.lib.styles import getSampleStyleSheet
+from functools import lru_cache
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from reportlab.platypus import Table
 
 
 def extract_loan_meta_from_responses(
@@ -64,231 +60,319 @@ def extract_loan_meta_from_responses(
 
 # ─────────────────────────────────────────────────────────────
 # 1) Styles
+#
+# ReportLab is imported lazily: callers that only need the comparison helpers
+# (status/diff, loan meta) should not pay its import cost.
+
+_STYLE_ALIASES = {"H1": "Heading1", "H2": "Heading2", "H3": "Heading3", "BODY": "Normal"}
+
+
+@lru_cache(maxsize=None)
+def _sample_styles():
+    from reportlab.lib.styles import getSampleStyleSheet
+
+    return getSampleStyleSheet()
+
+
+def __getattr__(name: str) -> Any:
+    # Keeps the old module-level `styles`, `H1`, `H2`, `H3` and `BODY` names working.
+    if name == "styles":
+        return _sample_styles()
+    if name in _STYLE_ALIASES:
+        return _sample_styles()[_STYLE_ALIASES[name]]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Max fee rows per detail Table; larger lists are split into several tables.
+FEE_TABLE_CHUNK_ROWS = 50
+
+# Column width fractions; each tuple must sum to 1.0 so the table fits the page width.
+_SUMMARY_FRACTIONS = (0.25, 0.75)
+_STATS_FRACTIONS = (0.4, 0.6)
+_FEE_FRACTIONS = (
+    0.22,  # Fee Name
+    0.06,  # Sec
+    0.08,  # Tol
+    0.10,  # LE Amt
+    0.10,  # CD Amt
+    0.08,  # Diff
+    0.20,  # Status
+    0.06,  # Conf
+    0.10,  # Provider
+)
 
-styles = getSampleStyleSheet()
-H1 = styles["Heading1"]
-H2 = styles["Heading2"]
-H3 = styles["Heading3"]
-BODY = styles["Normal"]
+# Rough Helvetica 8pt average glyph width and the default left+right cell padding,
+# used to size text so it fits a column without wrapping.
+_FEE_AVG_CHAR_WIDTH = 4.0
+_FEE_CELL_PADDING = 12.0
+
+_FEE_HEADER = (
+    "Fee Name",
+    "Sec",
+    "Tol.",
+    "LE Amt",
+    "CD Amt",
+    "Diff",
+    "Status",
+    "Conf.",
+    "Provider",
+)
+
+_VIOLATION_BG_HEX = "#ffe5e5"
+
+_TOP_ALIGN_CMD = ("VALIGN", (0, 0), (-1, -1), "TOP")
+_FEE_EXTRA_STYLE_CMDS = (
+    _TOP_ALIGN_CMD,
+    ("ALIGN", (3, 1), (5, -1), "RIGHT"),   # money columns
+    ("ALIGN", (7, 1), (7, -1), "RIGHT"),   # confidence
+    ("FONTSIZE", (0, 0), (-1, -1), 8),
+    ("LEADING", (0, 0), (-1, -1), 9),
+)
+
+
+@lru_cache(maxsize=None)
+def _base_style_cmds() -> tuple:
+    from reportlab.lib import colors
+
+    return (
+        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
+        ("BOX", (0, 0), (-1, -1), 0.5, colors.black),
+        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.grey),
+    )
+
+
+@lru_cache(maxsize=None)
+def _violation_bg():
+    from reportlab.lib import colors
+
+    return colors.HexColor(_VIOLATION_BG_HEX)
 
 
 # ─────────────────────────────────────────────────────────────
 # 2) Helper functions
 
+def coerce_datetime(value: Union[str, datetime]) -> datetime:
+    return value if isinstance(value, datetime) else datetime.fromisoformat(value)
+
+
+@lru_cache(maxsize=4096)
 def format_money(value: Optional[float]) -> str:
+    # Fee amounts repeat heavily across rows and reports, so the formatted string is cached.
     if value is None:
         return "—"
     return f"${value:,.2f}"
 
 
-def compute_status_and_diff(
-    le_amount: Optional[float],
-    cd_amount: Optional[float],
-    tolerance: str,
-) -> Dict[str, Any]:
+@lru_cache(maxsize=8)
+def column_widths(fractions: Tuple[float, ...], total_width: float) -> Tuple[float, ...]:
+    # Page width is effectively constant, so this is computed once per table layout.
+    return tuple(f * total_width for f in fractions)
+
+
+@lru_cache(maxsize=8)
+def _fee_text_limits(total_width: float) -> Tuple[int, int, int]:
+    """Max characters for the Fee Name, Status and Provider columns."""
+    col_widths = column_widths(_FEE_FRACTIONS, total_width)
+    return tuple(
+        max(4, int((col_widths[i] - _FEE_CELL_PADDING) / _FEE_AVG_CHAR_WIDTH))
+        for i in (0, 6, 8)
+    )
+
+
+def fit_text(text: Optional[str], max_chars: int) -> Optional[str]:
+    """Truncate `text` with an ellipsis so it fits a fixed-width, non-wrapping cell."""
+    if text is None or len(text) <= max_chars:
+        return text
+    return text[: max_chars - 1] + "…"
+
+
+def make_summary_table(loan_meta: Dict[str, Any], total_width: float) -> Table:
+    from reportlab.platypus import Table, TableStyle
+
+    rows = (
+        ("Field", "Value"),
+        ("Borrower(s)", loan_meta.get("borrower", "—")),
+        ("Property", loan_meta.get("property", "—")),
+        ("Loan ID", loan_meta.get("loan_id", "—")),
+        ("Loan Type", loan_meta.get("loan_type", "—")),
+        ("Purpose", loan_meta.get("purpose", "—")),
+        ("Product", loan_meta.get("product", "—")),
+        ("Term", loan_meta.get("term", "—")),
+        ("Sale Price", loan_meta.get("sale_price", "—")),
+        ("Loan Amount", loan_meta.get("loan_amount", "—")),
+    )
+    col_widths = column_widths(_SUMMARY_FRACTIONS, total_width)
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(TableStyle([*_base_style_cmds(), _TOP_ALIGN_CMD]))
+    return table
+
+
+_TOLERANCE_CODES = {"zero": 0, "ten_percent": 1, "unlimited": 2}
+
+# Status labels indexed by the codes produced in `compute_fee_statuses`.
+_STATUS_LABELS = (
+    "N/A",
+    "Added on CD",
+    "Missing on CD",
+    "Within tolerance (unlimited)",
+    "Exceeded ZERO tolerance",
+    "Within ZERO tolerance",
+    "Check manually",
+    "Exceeded 10% tolerance",
+    "Within 10% tolerance",
+    "Unknown tolerance",
+)
+
+
+def compute_fee_statuses(matched_fees: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
-    Basic tolerance logic:
+    Tolerance status, LE/CD difference and violation flag for every fee at once:
     - zero: cd must not exceed le (if both present)
     - ten_percent: cd <= le * 1.10
     - unlimited: always "OK" for tolerance purposes
-    Also classify missing/added fees.
+    Missing/added fees are classified too. Results keep the order of `matched_fees`.
     """
-    if le_amount is None and cd_amount is None:
-        return {"status": "N/A", "difference": None, "violates": False}
-
-    if le_amount is None and cd_amount is not None:
-        return {"status": "Added on CD", "difference": cd_amount, "violates": True}
+    if not matched_fees:
+        return []
 
-    if le_amount is not None and cd_amount is None:
-        return {"status": "Missing on CD", "difference": -le_amount, "violates": True}
-
-    diff = (cd_amount or 0.0) - (le_amount or 0.0)
+    le = np.array(
+        [np.nan if f.get("le_amount") is None else f["le_amount"] for f in matched_fees],
+        dtype=float,
+    )
+    cd = np.array(
+        [np.nan if f.get("cd_amount") is None else f["cd_amount"] for f in matched_fees],
+        dtype=float,
+    )
+    tol = np.array(
+        [
+            _TOLERANCE_CODES.get(f.get("tolerance_category", "unlimited"), -1)
+            for f in matched_fees
+        ]
+    )
 
-    if tolerance == "unlimited":
-        status = "Within tolerance (unlimited)"
-        violates = False
-    elif tolerance == "zero":
-        if diff > 0:
-            status = "Exceeded ZERO tolerance"
-            violates = True
-        else:
-            status = "Within ZERO tolerance"
-            violates = False
-    elif tolerance == "ten_percent":
-        if le_amount is None or le_amount == 0:
-            status = "Check manually"
-            violates = False
-        else:
-            allowed = le_amount * 0.10
-            if diff > allowed:
-                status = "Exceeded 10% tolerance"
-                violates = True
-            else:
-                status = "Within 10% tolerance"
-                violates = False
-    else:
-        status = "Unknown tolerance"
-        violates = False
+    le_missing = np.isnan(le)
+    cd_missing = np.isnan(cd)
+    both = ~le_missing & ~cd_missing
+    diff = cd - le
+
+    conditions = [
+        le_missing & cd_missing,
+        le_missing,
+        cd_missing,
+        tol == 2,
+        (tol == 0) & (diff > 0),
+        tol == 0,
+        (tol == 1) & (le == 0),
+        (tol == 1) & (diff > le * 0.10),
+        tol == 1,
+    ]
+    codes = np.select(conditions, np.arange(len(conditions)), default=len(conditions))
+    violates = (
+        (le_missing ^ cd_missing)
+        | (both & (tol == 0) & (diff > 0))
+        | (both & (tol == 1) & (le != 0) & (diff > le * 0.10))
+    )
+    difference = np.where(le_missing, cd, np.where(cd_missing, -le, diff))
+
+    return [
+        {
+            "status": _STATUS_LABELS[code],
+            "difference": None if code == 0 else value,
+            "violates": flag,
+        }
+        for code, value, flag in zip(codes.tolist(), difference.tolist(), violates.tolist())
+    ]
 
-    return {"status": status, "difference": diff, "violates": violates}
 
+def prepare_fee_rows(
+    matched_fees: List[Dict[str, Any]],
+) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Pair each fee with its status info; shared by the stats and detail tables."""
+    return list(zip(matched_fees, compute_fee_statuses(matched_fees)))
 
-def make_summary_table(loan_meta: Dict[str, Any], total_width: float) -> Table:
-    rows = [
-        ["Borrower(s)", loan_meta.get("borrower", "—")],
-        ["Property", loan_meta.get("property", "—")],
-        ["Loan ID", loan_meta.get("loan_id", "—")],
-        ["Loan Type", loan_meta.get("loan_type", "—")],
-        ["Purpose", loan_meta.get("purpose", "—")],
-        ["Product", loan_meta.get("product", "—")],
-        ["Term", loan_meta.get("term", "—")],
-        ["Sale Price", loan_meta.get("sale_price", "—")],
-        ["Loan Amount", loan_meta.get("loan_amount", "—")],
-    ]
-    col_widths = [0.25 * total_width, 0.75 * total_width]
-    table = Table([["Field", "Value"]] + rows, colWidths=col_widths)
-    table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("BOX", (0, 0), (-1, -1), 0.5, colors.black),
-                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.grey),
-                ("VALIGN", (0, 0), (-1, -1), "TOP"),
-            ]
-        )
-    )
-    return table
 
+def make_stats_table(
+    prepared: List[Tuple[Dict[str, Any], Dict[str, Any]]],
+    total_width: float,
+) -> Table:
+    from reportlab.platypus import Table, TableStyle
 
-def make_stats_table(matched_fees: List[Dict[str, Any]], total_width: float) -> Table:
-    total = len(matched_fees)
+    total = len(prepared)
     viol_count = 0
-    zero_count = ten_count = unlim_count = 0
-
-    for fee in matched_fees:
-        tol = fee.get("tolerance_category")
-        if tol == "zero":
-            zero_count += 1
-        elif tol == "ten_percent":
-            ten_count += 1
-        elif tol == "unlimited":
-            unlim_count += 1
-
-        status_info = compute_status_and_diff(
-            fee.get("le_amount"),
-            fee.get("cd_amount"),
-            fee.get("tolerance_category", "unlimited"),
-        )
+    tol_counts: Counter = Counter()
+
+    for fee, status_info in prepared:
+        tol_counts[fee.get("tolerance_category")] += 1
         if status_info["violates"]:
             viol_count += 1
 
+    zero_count = tol_counts["zero"]
+    ten_count = tol_counts["ten_percent"]
+    unlim_count = tol_counts["unlimited"]
     ok_count = total - viol_count
 
-    rows = [
-        ["Total Fees (matched/compared)", str(total)],
-        ["Within tolerance (count)", str(ok_count)],
-        ["Tolerance issues (count)", str(viol_count)],
-        ["Zero Tolerance Fees (A, B)", str(zero_count)],
-        ["10% Tolerance Fees (C, E)", str(ten_count)],
-        ["Unlimited Tolerance Fees (F, G, H)", str(unlim_count)],
-    ]
-    col_widths = [0.4 * total_width, 0.6 * total_width]
-    table = Table([["Metric", "Value"]] + rows, colWidths=col_widths)
-    table.setStyle(
-        TableStyle(
-            [
-                ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-                ("BOX", (0, 0), (-1, -1), 0.5, colors.black),
-                ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.grey),
-            ]
-        )
+    rows = (
+        ("Metric", "Value"),
+        ("Total Fees (matched/compared)", str(total)),
+        ("Within tolerance (count)", str(ok_count)),
+        ("Tolerance issues (count)", str(viol_count)),
+        ("Zero Tolerance Fees (A, B)", str(zero_count)),
+        ("10% Tolerance Fees (C, E)", str(ten_count)),
+        ("Unlimited Tolerance Fees (F, G, H)", str(unlim_count)),
     )
+    col_widths = column_widths(_STATS_FRACTIONS, total_width)
+    table = Table(rows, colWidths=col_widths)
+    table.setStyle(TableStyle(list(_base_style_cmds())))
     return table
 
 
 def make_fee_detail_table(
-    matched_fees: List[Dict[str, Any]],
+    prepared: List[Tuple[Dict[str, Any], Dict[str, Any]]],
     total_width: float,
 ) -> Table:
-    header = [
-        "Fee Name",
-        "Sec",
-        "Tol.",
-        "LE Amt",
-        "CD Amt",
-        "Diff",
-        "Status",
-        "Conf.",
-        "Provider",
-    ]
-    rows = [header]
+    from reportlab.platypus import LongTable, TableStyle
 
-    for fee in matched_fees:
+    rows = [_FEE_HEADER]
+    # Highlight violations in light red
+    highlight_cmds = []
+    violation_bg = _violation_bg()
+
+    col_widths = column_widths(_FEE_FRACTIONS, total_width)
+    name_chars, status_chars, provider_chars = _fee_text_limits(total_width)
+
+    for idx, (fee, status_info) in enumerate(prepared, start=1):
         le_amt = fee.get("le_amount")
         cd_amt = fee.get("cd_amount")
         tol = fee.get("tolerance_category", "unlimited")
-        status_info = compute_status_and_diff(le_amt, cd_amt, tol)
 
         diff_val = status_info["difference"]
         if diff_val is None:
             diff_str = "—"
+        elif diff_val:
+            diff_str = format(diff_val, "+,.2f")
         else:
-            sign = "+" if diff_val > 0 else ""
-            diff_str = f"{sign}{diff_val:,.2f}"
+            diff_str = "0.00"
 
-        row = [
-            fee.get("fee_name", "—"),
+        row = (
+            fit_text(fee.get("fee_name", "—"), name_chars),
             fee.get("section", "—"),
             tol,
             format_money(le_amt),
             format_money(cd_amt),
             diff_str,
-            status_info["status"],
+            fit_text(status_info["status"], status_chars),
             f"{fee.get('match_confidence', 0.0):.2f}",
-            fee.get("provider_name") or "—",
-        ]
-        rows.append(row)
-
-    # Fractions must sum to 1.0 – this guarantees it fits the page width.
-    fractions = [
-        0.22,  # Fee Name
-        0.06,  # Sec
-        0.08,  # Tol
-        0.10,  # LE Amt
-        0.10,  # CD Amt
-        0.08,  # Diff
-        0.20,  # Status
-        0.06,  # Conf
-        0.10,  # Provider
-    ]
-    col_widths = [f * total_width for f in fractions]
-
-    table = Table(rows, colWidths=col_widths, repeatRows=1)
-
-    style_cmds = [
-        ("BACKGROUND", (0, 0), (-1, 0), colors.lightgrey),
-        ("BOX", (0, 0), (-1, -1), 0.5, colors.black),
-        ("INNERGRID", (0, 0), (-1, -1), 0.25, colors.grey),
-        ("VALIGN", (0, 0), (-1, -1), "TOP"),
-        ("ALIGN", (3, 1), (5, -1), "RIGHT"),   # money columns
-        ("ALIGN", (7, 1), (7, -1), "RIGHT"),   # confidence
-        ("FONTSIZE", (0, 0), (-1, -1), 8),
-        ("LEADING", (0, 0), (-1, -1), 9),
-    ]
-
-    # Highlight violations in light red
-    for idx, fee in enumerate(matched_fees, start=1):
-        status_info = compute_status_and_diff(
-            fee.get("le_amount"),
-            fee.get("cd_amount"),
-            fee.get("tolerance_category", "unlimited"),
+            fit_text(fee.get("provider_name") or "—", provider_chars),
         )
+        rows.append(row)
         if status_info["violates"]:
-            style_cmds.append(
-                ("BACKGROUND", (0, idx), (-1, idx), colors.HexColor("#ffe5e5"))
+            highlight_cmds.append(
+                ("BACKGROUND", (0, idx), (-1, idx), violation_bg)
             )
 
-    table.setStyle(TableStyle(style_cmds))
+    # Cells are pre-truncated plain strings, so every row has a fixed single-line
+    # height and ReportLab never has to wrap or re-measure content while splitting.
+    table = LongTable(rows, colWidths=col_widths, repeatRows=1, splitByRow=1)
+    table.setStyle(TableStyle([*_base_style_cmds(), *_FEE_EXTRA_STYLE_CMDS, *highlight_cmds]))
     return table
 
 
@@ -300,11 +384,23 @@ def build_trid_curated_report(
     loan_meta: Dict[str, Any],
     output_path: str = "trid_curated_report.pdf",
 ) -> None:
+    from reportlab.lib.pagesizes import LETTER, landscape
+    from reportlab.lib.units import inch
+    from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer
+
+    styles = _sample_styles()
+    h1, h2, h3 = styles["Heading1"], styles["Heading2"], styles["Heading3"]
+    body = styles["Normal"]
+
     matched_fees: List[Dict[str, Any]] = comparison.get("matched_fees", [])
-    processed_at: str = comparison.get("processed_at", datetime.now().isoformat())
+    processed_at = coerce_datetime(comparison.get("processed_at") or datetime.now())
+    prepared = prepare_fee_rows(matched_fees)
 
+    # Build into a temp file and move it into place, so a failed build never
+    # leaves a truncated but valid-looking PDF at `output_path`.
+    tmp_path = Path(f"{output_path}.tmp")
     doc = SimpleDocTemplate(
-        output_path,
+        str(tmp_path),
         pagesize=landscape(LETTER),
         topMargin=0.7 * inch,
         bottomMargin=0.7 * inch,
@@ -317,47 +413,70 @@ def build_trid_curated_report(
     story = []
 
     # Header
-    story.append(Paragraph("TRID Curated Comparison Report", H1))
+    story.append(Paragraph("TRID Curated Comparison Report", h1))
     story.append(
         Paragraph(
-            f"Generated At: {datetime.fromisoformat(processed_at):%Y-%m-%d %H:%M:%S}",
-            BODY,
+            f"Generated At: {processed_at:%Y-%m-%d %H:%M:%S}",
+            body,
         )
     )
     story.append(Spacer(1, 0.15 * inch))
 
     # Loan summary
-    story.append(Paragraph("Loan & Property Summary", H2))
+    story.append(Paragraph("Loan & Property Summary", h2))
     story.append(Spacer(1, 0.05 * inch))
     story.append(make_summary_table(loan_meta, width))
     story.append(Spacer(1, 0.2 * inch))
 
     # Stats summary
-    story.append(Paragraph("TRID Fee Matching Summary", H2))
+    story.append(Paragraph("TRID Fee Matching Summary", h2))
     story.append(Spacer(1, 0.05 * inch))
-    story.append(make_stats_table(matched_fees, width))
+    story.append(make_stats_table(prepared, width))
     story.append(Spacer(1, 0.2 * inch))
 
     # Optional narrative summary
     summary_dict = comparison.get("summary", {})
     if isinstance(summary_dict, dict) and summary_dict:
-        story.append(Paragraph("AI Summary (Optional)", H3))
-        bullets = []
-        for k, v in summary_dict.items():
-            bullets.append(f"• <b>{k}:</b> {v}")
-        story.append(Paragraph("<br/>".join(bullets), BODY))
+        story.append(Paragraph("AI Summary (Optional)", h3))
+        # Values come from the model, so escape them before handing off to Paragraph markup.
+        bullets_html = "<br/>".join(
+            f"• <b>{html.escape(str(k))}:</b> {html.escape(str(v))}"
+            for k, v in summary_dict.items()
+        )
+        story.append(Paragraph(bullets_html, body))
         story.append(Spacer(1, 0.2 * inch))
 
     # Fees detail page
     story.append(PageBreak())
-    story.append(Paragraph("Detailed Fee Comparison (Loan Estimate vs Closing Disclosure)", H2))
+    story.append(Paragraph("Detailed Fee Comparison (Loan Estimate vs Closing Disclosure)", h2))
     story.append(Spacer(1, 0.1 * inch))
-    if matched_fees:
-        story.append(make_fee_detail_table(matched_fees, width))
+    if prepared:
+        # Group rows by tolerance (zero → 10% → unlimited) so violations cluster and
+        # repeated cell text compresses better in the PDF stream.
+        detail_rows = sorted(
+            prepared,
+            key=lambda item: (
+                _TOLERANCE_CODES.get(item[0].get("tolerance_category"), len(_TOLERANCE_CODES)),
+                item[0].get("section") or "",
+                item[0].get("fee_name") or "",
+            ),
+        )
+        # Emit the detail table in fixed-size chunks so ReportLab lays out (and
+        # releases) each one independently instead of one huge table.
+        for start in range(0, len(detail_rows), FEE_TABLE_CHUNK_ROWS):
+            if start:
+                story.append(Spacer(1, 0.05 * inch))
+            chunk = detail_rows[start : start + FEE_TABLE_CHUNK_ROWS]
+            story.append(make_fee_detail_table(chunk, width))
     else:
-        story.append(Paragraph("No matched fees found in comparison.", BODY))
-
-    doc.build(story)
+        story.append(Paragraph("No matched fees found in comparison.", body))
+
+    try:
+        doc.build(story)
+        tmp_path.replace(output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
     print(f"✅ TRID curated report created at: {output_path}")
 
 
@@ -366,7 +485,7 @@ def build_trid_curated_report(
 
 def make_dummy_comparison() -> Dict[str, Any]:
     return {
-        "processed_at": datetime.now().isoformat(),
+        "processed_at": datetime.now(),
         "summary": {
             "high_level": "Most fees are within TRID tolerance; a few zero-tolerance items exceed LE amounts.",
             "zero_tolerance_issues": "Origination Fee increased from LE to CD.",
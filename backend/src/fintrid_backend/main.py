@@ -1,34 +1,66 @@
 from __future__ import annotations
 
 import asyncio
+import hashlib
 import io
 import json
+import multiprocessing
 import os
 import re
-import tempfile
-from collections import defaultdict
+import shutil
+import sqlite3
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager, closing
 from datetime import datetime
+from functools import lru_cache
+from itertools import count, repeat
 from pathlib import Path
-from typing import Optional, Dict, List, Literal, Any, AsyncIterator, Tuple
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+)
 
 from dotenv import load_dotenv
-from fastapi import FastAPI, UploadFile, File, Query, HTTPException
+from fastapi import FastAPI, UploadFile, File, Query, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse, StreamingResponse
 from starlette.concurrency import run_in_threadpool
 
+import numpy as np
+import orjson
 import pdfplumber
-from PyPDF2 import PdfReader, PdfWriter
-from rapidfuzz import fuzz
-from reportlab.pdfgen import canvas
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import DecodedStreamObject
+from rapidfuzz import fuzz, process
 
 from fintrid_backend.generate_trid_curated_report import (
     build_trid_curated_report,
     extract_loan_meta_from_responses,
 )
+from fintrid_backend.pdf_layout import (
+    NON_ALNUM_PATTERN,
+    NON_DIGIT_PATTERN,
+    WHITESPACE_PATTERN,
+    _extract_page_layout,
+    _extract_pdf_page_range,
+    _normalize_for_fuzz,
+    _normalize_text,
+    _tokenize_text,
+)
 
 # ---------- LandingAI (PDF -> Markdown) ----------
-from landingai_ade import LandingAIADE
+from landingai_ade import AsyncLandingAIADE
 
 # ---------- Gemini / LangChain (Markdown -> JSON) ----------
 from langchain_core.messages import SystemMessage, HumanMessage
@@ -36,30 +68,50 @@ from langchain_core.runnables import RunnableLambda
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_google_genai.chat_models import ChatGoogleGenerativeAIError
 
-# ---------- Pydantic v1 schema ----------
-from pydantic.v1 import BaseModel, Field, validator, conint, confloat
+# ---------- Pydantic schema ----------
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    Field,
+    ValidationError,
+    ValidationInfo,
+    field_validator,
+)
 
 # Load environment variables
 load_dotenv()
 
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def compact_json(value: Any) -> str:
+    """Compact JSON for LLM prompts: no indentation, so fewer tokens and a faster dump."""
+    return orjson.dumps(value, option=ORJSON_OPTIONS).decode()
+
 # ──────────────────────────────────────────────────────────────────────────────
 # 1) Schema (Pydantic models)
 
-Currency = confloat(ge=-1e9, le=1e9)
+Currency = Annotated[float, Field(ge=-1e9, le=1e9)]
+Percent = Annotated[float, Field(ge=0, le=100)]
+
 
+class SchemaModel(BaseModel):
+    # LLM output often has numeric IDs, zip codes, etc. where the schema says str.
+    model_config = ConfigDict(coerce_numbers_to_str=True)
 
-class LatePayment(BaseModel):
-    late_after_days: Optional[conint(ge=0)] = None
-    fee_pct_of_monthly_p_and_i: Optional[confloat(ge=0, le=100)] = None
 
+class LatePayment(SchemaModel):
+    late_after_days: Optional[Annotated[int, Field(ge=0)]] = None
+    fee_pct_of_monthly_p_and_i: Optional[Percent] = None
 
-class RateLock(BaseModel):
+
+class RateLock(SchemaModel):
     is_locked: Optional[bool] = None
     until: Optional[str] = None
     timezone: Optional[str] = None
 
 
-class LoanCore(BaseModel):
+class LoanCore(SchemaModel):
     loan_id: Optional[str] = None
     type: Optional[Literal["conventional", "fha", "va", "other"]] = None
     purpose: Optional[Literal["purchase", "refinance", "construction", "other"]] = None
@@ -71,21 +123,21 @@ class LoanCore(BaseModel):
     costs_expire_at: Optional[Dict[str, Optional[str]]] = None
 
 
-class Feature(BaseModel):
+class Feature(SchemaModel):
     has: Optional[bool] = None
     amount: Optional[Currency] = None
     due_month: Optional[int] = None
     note: Optional[str] = None
 
 
-class LoanTerms(BaseModel):
+class LoanTerms(SchemaModel):
     loan_amount: Optional[Currency] = None
-    interest_rate_pct: Optional[confloat(ge=0, le=100)] = None
+    interest_rate_pct: Optional[Percent] = None
     monthly_principal_interest: Optional[Currency] = None
     features: Optional[Dict[str, Feature]] = None
 
 
-class PeriodPayment(BaseModel):
+class PeriodPayment(SchemaModel):
     period_label: Optional[str] = None
     from_month: Optional[int] = None
     to_month: Optional[int] = None
@@ -95,14 +147,14 @@ class PeriodPayment(BaseModel):
     estimated_total_monthly_payment: Optional[Currency] = None
 
 
-class TaxesInsuranceAssessments(BaseModel):
+class TaxesInsuranceAssessments(SchemaModel):
     estimate_per_month: Optional[Currency] = None
     in_escrow: Optional[bool] = None
     includes: Optional[Dict[str, Optional[bool]]] = None
     note: Optional[str] = None
 
 
-class CostsAtClosing(BaseModel):
+class CostsAtClosing(SchemaModel):
     estimated_closing_costs: Optional[Currency] = None
     estimated_cash_to_close: Optional[Currency] = None
 
@@ -117,55 +169,55 @@ SubLabel = Literal[
 Payer = Literal["borrower", "seller", "other"]
 Timing = Literal["at_closing", "before_closing", "n/a"]
 
+# Payer/timing implied by each CD sub_label, used when the model leaves them empty.
+SUB_LABEL_PAYER: Dict[str, str] = {
+    "borrower_paid_at_closing": "borrower",
+    "borrower_paid_before_closing": "borrower",
+    "seller_paid_at_closing": "seller",
+    "seller_paid_before_closing": "seller",
+    "paid_by_others": "other",
+}
+SUB_LABEL_TIMING: Dict[str, str] = {
+    "borrower_paid_at_closing": "at_closing",
+    "borrower_paid_before_closing": "before_closing",
+    "seller_paid_at_closing": "at_closing",
+    "seller_paid_before_closing": "before_closing",
+    "paid_by_others": "n/a",
+}
+
 
-class LineItem(BaseModel):
+class LineItem(SchemaModel):
     label: Optional[str] = None
     amount: Optional[Currency] = None
     sub_label: Optional[SubLabel] = None
-    payer: Optional[Payer] = None
-    timing: Optional[Timing] = None
+    payer: Optional[Payer] = Field(None, validate_default=True)
+    timing: Optional[Timing] = Field(None, validate_default=True)
 
-    @validator("payer", always=True)
-    def _derive_payer(cls, v, values):
-        if v is not None:
-            return v
-        sub = values.get("sub_label")
-        if sub in ("borrower_paid_at_closing", "borrower_paid_before_closing"):
-            return "borrower"
-        if sub in ("seller_paid_at_closing", "seller_paid_before_closing"):
-            return "seller"
-        if sub == "paid_by_others":
-            return "other"
-        return v
+    @field_validator("payer")
+    @classmethod
+    def _derive_payer(cls, v, info: ValidationInfo):
+        return v if v is not None else SUB_LABEL_PAYER.get(info.data.get("sub_label"))
 
-    @validator("timing", always=True)
-    def _derive_timing(cls, v, values):
-        if v is not None:
-            return v
-        sub = values.get("sub_label")
-        if sub in ("borrower_paid_at_closing", "seller_paid_at_closing"):
-            return "at_closing"
-        if sub in ("borrower_paid_before_closing", "seller_paid_before_closing"):
-            return "before_closing"
-        if sub == "paid_by_others":
-            return "n/a"
-        return v
+    @field_validator("timing")
+    @classmethod
+    def _derive_timing(cls, v, info: ValidationInfo):
+        return v if v is not None else SUB_LABEL_TIMING.get(info.data.get("sub_label"))
 
 
-class SectionWithItems(BaseModel):
+class SectionWithItems(SchemaModel):
     label: Optional[str] = None
     total: Optional[Currency] = None
     items: Optional[List[LineItem]] = None
 
 
-class LoanCosts(BaseModel):
+class LoanCosts(SchemaModel):
     A: Optional[SectionWithItems] = None
     B: Optional[SectionWithItems] = None
     C: Optional[SectionWithItems] = None
     D_total: Optional[Currency] = None
 
 
-class OtherCosts(BaseModel):
+class OtherCosts(SchemaModel):
     E: Optional[SectionWithItems] = None
     F: Optional[SectionWithItems] = None
     G: Optional[SectionWithItems] = None
@@ -175,7 +227,7 @@ class OtherCosts(BaseModel):
     lender_credits: Optional[Currency] = 0.0
 
 
-class CashToClose(BaseModel):
+class CashToClose(SchemaModel):
     total_closing_costs_J: Optional[Currency] = None
     financed_from_loan: Optional[Currency] = None
     down_payment: Optional[Currency] = None
@@ -186,25 +238,25 @@ class CashToClose(BaseModel):
     estimated_cash_to_close: Optional[Currency] = None
 
 
-class ClosingCostDetails(BaseModel):
+class ClosingCostDetails(SchemaModel):
     loan_costs: Optional[LoanCosts] = None
     other_costs: Optional[OtherCosts] = None
     cash_to_close: Optional[CashToClose] = None
 
 
-class Contacts(BaseModel):
+class Contacts(SchemaModel):
     lender: Optional[Dict[str, Optional[str]]] = None
     loan_officer: Optional[Dict[str, Optional[str]]] = None
     mortgage_broker: Optional[Dict[str, Optional[str]]] = None
 
 
-class Comparisons(BaseModel):
+class Comparisons(SchemaModel):
     in_5_years: Optional[Dict[str, Optional[Currency]]] = None
-    apr_pct: Optional[confloat(ge=0, le=100)] = None
-    tip_pct: Optional[confloat(ge=0, le=100)] = None
+    apr_pct: Optional[Percent] = None
+    tip_pct: Optional[Percent] = None
 
 
-class OtherConsiderations(BaseModel):
+class OtherConsiderations(SchemaModel):
     appraisal_may_be_ordered: Optional[bool] = None
     assumption_allowed: Optional[bool] = None
     homeowners_insurance_required: Optional[bool] = None
@@ -213,12 +265,12 @@ class OtherConsiderations(BaseModel):
     servicing_intent: Optional[Literal["service", "transfer", "unknown"]] = None
 
 
-class Applicant(BaseModel):
+class Applicant(SchemaModel):
     name: Optional[str] = None
     address: Optional[str] = None
 
 
-class Meta(BaseModel):
+class Meta(SchemaModel):
     source_id: Optional[str] = None
     source_file: Optional[str] = None
     page_count: Optional[int] = 3
@@ -226,7 +278,11 @@ class Meta(BaseModel):
     parser_version: Optional[str] = "1.0.0"
 
 
-class LoanEstimateRecord(BaseModel):
+def _section_total(section: Any) -> Optional[float]:
+    return section.total if section is not None else None
+
+
+class LoanEstimateRecord(SchemaModel):
     meta: Optional[Meta] = None
     applicants: Optional[List[Applicant]] = None
     property: Optional[Dict[str, Optional[str]]] = None
@@ -242,33 +298,28 @@ class LoanEstimateRecord(BaseModel):
     other_considerations: Optional[OtherConsiderations] = None
     confirm_receipt: Optional[Dict[str, Optional[bool]]] = None
 
-    @validator("closing_cost_details", pre=False, always=False)
+    @field_validator("closing_cost_details")
+    @classmethod
     def recompute_totals(cls, v: ClosingCostDetails | None) -> ClosingCostDetails | None:
         if not v or not v.loan_costs or not v.other_costs:
             return v
 
-        A = v.loan_costs.A.total if v.loan_costs.A and v.loan_costs.A.total is not None else None
-        B = v.loan_costs.B.total if v.loan_costs.B and v.loan_costs.B.total is not None else None
-        C = v.loan_costs.C.total if v.loan_costs.C and v.loan_costs.C.total is not None else None
+        loan, other = v.loan_costs, v.other_costs
+        abc = [_section_total(loan.A), _section_total(loan.B), _section_total(loan.C)]
+        if None not in abc:
+            loan.D_total = round(sum(map(float, abc)), 2)
 
-        if all(x is not None for x in [A, B, C]):
-            v.loan_costs.D_total = round(float(A) + float(B) + float(C), 2)
-
-        E = v.other_costs.E.total if v.other_costs.E and v.other_costs.E.total is not None else None
-        F = v.other_costs.F.total if v.other_costs.F and v.other_costs.F.total is not None else None
-        G = v.other_costs.G.total if v.other_costs.G and v.other_costs.G.total is not None else None
-        H = v.other_costs.H.total if v.other_costs.H and v.other_costs.H.total is not None else None
-
-        if all(x is not None for x in [E, F, G, H]):
-            v.other_costs.I_total = round(float(E) + float(F) + float(G) + float(H), 2)
+        efgh = [
+            _section_total(other.E),
+            _section_total(other.F),
+            _section_total(other.G),
+            _section_total(other.H),
+        ]
+        if None not in efgh:
+            other.I_total = round(sum(map(float, efgh)), 2)
 
-        if (
-            v.loan_costs
-            and v.other_costs
-            and v.loan_costs.D_total is not None
-            and v.other_costs.I_total is not None
-        ):
-            v.other_costs.J_total = round(float(v.loan_costs.D_total) + float(v.other_costs.I_total), 2)
+        if loan.D_total is not None and other.I_total is not None:
+            other.J_total = round(float(loan.D_total) + float(other.I_total), 2)
 
         return v
 
@@ -276,7 +327,7 @@ class LoanEstimateRecord(BaseModel):
 # ──────────────────────────────────────────────────────────────────────────────
 # AI-Powered Fee Matching Schema
 
-class MatchedFee(BaseModel):
+class MatchedFee(SchemaModel):
     """A single matched fee between LE and CD"""
     fee_name: str = Field(description="Normalized fee name")
     section: str = Field(description="Section: A, B, C, E, F, G, H")
@@ -308,7 +359,7 @@ class MatchedFee(BaseModel):
     )
 
 
-class FeeDiffSummary(BaseModel):
+class FeeDiffSummary(SchemaModel):
     fee_name: Optional[str] = None
     section: Optional[str] = None
     tolerance_category: Optional[str] = None
@@ -327,7 +378,7 @@ class FeeDiffSummary(BaseModel):
     reclassified_amount: Optional[Currency] = None
 
 
-class PdfHighlightAsset(BaseModel):
+class PdfHighlightAsset(SchemaModel):
     source_pdf_path: Optional[str] = None
     highlighted_pdf_path: Optional[str] = None
     page_count: Optional[int] = None
@@ -335,13 +386,13 @@ class PdfHighlightAsset(BaseModel):
     generated_at: str = Field(default_factory=lambda: datetime.now().isoformat())
 
 
-class PdfHighlightBundle(BaseModel):
+class PdfHighlightBundle(SchemaModel):
     loan_estimate: Optional[PdfHighlightAsset] = None
     closing_disclosure: Optional[PdfHighlightAsset] = None
     legend: Optional[Dict[str, str]] = None
 
 
-class TRIDComparison(BaseModel):
+class TRIDComparison(SchemaModel):
     """AI-processed TRID comparison between LE and CD"""
     matched_fees: List[MatchedFee] = Field(default_factory=list)
     summary: Optional[Dict[str, Any]] = Field(default_factory=dict)
@@ -350,7 +401,7 @@ class TRIDComparison(BaseModel):
     pdf_highlights: Optional[PdfHighlightBundle] = None
 
 
-class FinancialProfileSummary(BaseModel):
+class FinancialProfileSummary(SchemaModel):
     """Comprehensive financial profile summary"""
     borrower_overview: str = Field(description="Summary of borrower(s) and property")
     loan_overview: str = Field(description="Loan type, purpose, and key terms")
@@ -365,6 +416,82 @@ class FinancialProfileSummary(BaseModel):
 # ──────────────────────────────────────────────────────────────────────────────
 # 2) Document Type Detection
 
+FEE_SECTIONS = (
+    ("A", "loan_costs"),
+    ("B", "loan_costs"),
+    ("C", "loan_costs"),
+    ("E", "other_costs"),
+    ("F", "other_costs"),
+    ("G", "other_costs"),
+    ("H", "other_costs"),
+)
+
+
+def _iter_section_lists(closing_cost_details: Optional[dict]) -> Iterator[Tuple[str, List[dict]]]:
+    """Yield (section, items) for sections A-C and E-H, in order; missing sections are []."""
+    details = closing_cost_details or {}
+    bags = {
+        "loan_costs": details.get("loan_costs") or {},
+        "other_costs": details.get("other_costs") or {},
+    }
+    for sec, bag in FEE_SECTIONS:
+        yield sec, (bags[bag].get(sec) or {}).get("items") or []
+
+
+def _iter_section_items(closing_cost_details: Optional[dict]) -> Iterator[Tuple[str, dict]]:
+    """Yield (section, item) for every line item in sections A-C and E-H, in order."""
+    for sec, items in _iter_section_lists(closing_cost_details):
+        for item in items:
+            yield sec, item
+
+
+def _section_items(record: dict) -> Dict[str, List[dict]]:
+    """{"section_A": items, ..., "section_H": items} for the matching prompt, in one walk."""
+    return {
+        f"section_{sec}": items
+        for sec, items in _iter_section_lists(record.get("closing_cost_details"))
+    }
+
+
+BORROWER_SUB_LABELS = frozenset({"borrower_paid_at_closing", "borrower_paid_before_closing"})
+
+
+def _le_prompt_sections(record: dict) -> Dict[str, List[dict]]:
+    """LE items trimmed to the label and amount the matcher needs."""
+    sections: Dict[str, List[dict]] = {}
+    for key, items in _section_items(record).items():
+        trimmed = (
+            {k: item[k] for k in ("label", "amount") if item.get(k) is not None}
+            for item in items
+        )
+        sections[key] = [item for item in trimmed if item]
+    return sections
+
+
+def _cd_prompt_sections(record: dict) -> Dict[str, List[dict]]:
+    """
+    Borrower-paid CD items only, with at-closing and before-closing amounts for the same
+    label already summed, so the model neither filters nor adds.
+    """
+    sections: Dict[str, List[dict]] = {}
+    for key, items in _section_items(record).items():
+        totals: Dict[Optional[str], Optional[float]] = {}
+        for item in items:
+            if item.get("sub_label") not in BORROWER_SUB_LABELS:
+                continue
+            label, amount = item.get("label"), item.get("amount")
+            previous = totals.get(label)
+            if amount is None:
+                totals[label] = previous
+            else:
+                totals[label] = round((previous or 0.0) + float(amount), 2)
+        sections[key] = [
+            {k: v for k, v in (("label", label), ("amount", amount)) if v is not None}
+            for label, amount in totals.items()
+        ]
+    return sections
+
+
 def detect_document_type(record: dict) -> Literal["loan_estimate", "closing_disclosure", "unknown"]:
     """Detect if a document is a Loan Estimate or Closing Disclosure based on its structure"""
     closing_cost_details = record.get("closing_cost_details", {})
@@ -372,35 +499,10 @@ def detect_document_type(record: dict) -> Literal["loan_estimate", "closing_disc
     if not closing_cost_details:
         return "unknown"
 
-    loan_costs = closing_cost_details.get("loan_costs", {})
-    other_costs = closing_cost_details.get("other_costs", {})
-
-    has_sub_labels = False
-    for section_key in ["A", "B", "C"]:
-        section = loan_costs.get(section_key, {})
-        items = section.get("items", [])
-        for item in items:
-            if item.get("sub_label"):
-                has_sub_labels = True
-                break
-        if has_sub_labels:
-            break
-
-    if not has_sub_labels:
-        for section_key in ["E", "F", "G", "H"]:
-            section = other_costs.get(section_key, {})
-            items = section.get("items", [])
-            for item in items:
-                if item.get("sub_label"):
-                    has_sub_labels = True
-                    break
-            if has_sub_labels:
-                break
-
-    if has_sub_labels:
+    # Only the CD splits items by payer, so the first sub_label settles it.
+    if any(item.get("sub_label") for _, item in _iter_section_items(closing_cost_details)):
         return "closing_disclosure"
-    else:
-        return "loan_estimate"
+    return "loan_estimate"
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -447,15 +549,20 @@ Return a complete TRIDComparison with all matched BORROWER-PAID fees.
 """
 
 
+def _matching_cache_version() -> str:
+    # Changes whenever the matching prompt or output schema changes, invalidating cached
+    # matches.
+    fingerprint = MATCHING_SYSTEM + json.dumps(TRIDComparison.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+MATCHING_CACHE_VERSION = _matching_cache_version()
+
+
 DIFF_EPSILON = 0.01
-SECTION_HEADER_PATTERN = re.compile(r"^([A-H])\.\s", re.IGNORECASE)
-E_RECORDING_TOKENS = {
-    "recording",
-    "deed recording",
-    "mortgage recording",
-    "recording fee",
-    "recordation",
-}
+LEADING_ROW_NUMBER_PATTERN = re.compile(r"^\s*\d{2}\s*[-.:)]?\s*")
+TO_PROVIDER_TAIL_PATTERN = re.compile(r"\bto\b.+$")
+ROW_HINT_PATTERN = re.compile(r"^\s*(\d{2})\b")
 E_TRANSFER_TAX_TOKENS = {
     "transfer tax",
     "transfer taxes",
@@ -466,55 +573,85 @@ E_TRANSFER_TAX_TOKENS = {
 }
 
 
-def classify_fee_tolerance(
-    section: Optional[str],
-    label: Optional[str],
-    chosen_from_list: Optional[bool],
-    changed_circumstance: Optional[bool],
-) -> str:
-    sec = (section or "").strip().upper()
-    text = (label or "").lower()
+E_TRANSFER_TAX_PATTERN = re.compile(
+    "|".join(re.escape(token) for token in sorted(E_TRANSFER_TAX_TOKENS, key=len, reverse=True))
+)
+
+
+def _tolerance_section_a(label: str, from_list: Optional[bool], changed: Optional[bool]) -> str:
+    return "zero"
+
+
+def _tolerance_section_b(label: str, from_list: Optional[bool], changed: Optional[bool]) -> str:
+    return "unlimited" if changed else "zero"
+
+
+def _tolerance_section_c(label: str, from_list: Optional[bool], changed: Optional[bool]) -> str:
+    return "ten_percent" if from_list else "unlimited"
 
-    if sec == "A":
-        return "zero"
 
-    if sec == "B":
-        if changed_circumstance:
-            return "unlimited"
+def _tolerance_section_e(label: str, from_list: Optional[bool], changed: Optional[bool]) -> str:
+    # Transfer taxes are zero tolerance; recording fees and everything else in E fall
+    # into the 10% bucket.
+    if E_TRANSFER_TAX_PATTERN.search(label.lower()):
         return "zero"
+    return "ten_percent"
 
-    if sec == "C":
-        return "ten_percent" if chosen_from_list else "unlimited"
 
-    if sec == "E":
-        if any(token in text for token in E_TRANSFER_TAX_TOKENS):
-            return "zero"
-        if any(token in text for token in E_RECORDING_TOKENS):
-            return "ten_percent"
-        return "ten_percent"
+# Sections without an entry (F, G, H and unknown) are unlimited.
+TOLERANCE_BY_SECTION = {
+    "A": _tolerance_section_a,
+    "B": _tolerance_section_b,
+    "C": _tolerance_section_c,
+    "E": _tolerance_section_e,
+}
+
 
-    if sec in {"F", "G", "H"}:
+def classify_fee_tolerance(
+    section: Optional[str],
+    label: Optional[str],
+    chosen_from_list: Optional[bool],
+    changed_circumstance: Optional[bool],
+) -> str:
+    handler = TOLERANCE_BY_SECTION.get((section or "").strip().upper())
+    if handler is None:
         return "unlimited"
+    return handler(label or "", chosen_from_list, changed_circumstance)
 
-    return "unlimited"
+
+TOLERANCE_BUCKETS = ("zero", "ten_percent", "unlimited")
+_TOLERANCE_BUCKET_INDEX = {name: idx for idx, name in enumerate(TOLERANCE_BUCKETS)}
 
 
 def compute_tolerance_metrics(matched_fees: List[Dict[str, Any]]) -> Dict[str, Any]:
+    count = len(matched_fees)
+    unlimited_idx = _TOLERANCE_BUCKET_INDEX["unlimited"]
+    buckets = np.fromiter(
+        (
+            _TOLERANCE_BUCKET_INDEX.get(fee.get("tolerance_category"), unlimited_idx)
+            for fee in matched_fees
+        ),
+        dtype=np.intp,
+        count=count,
+    )
+    le = np.fromiter(
+        (float(fee.get("le_amount") or 0.0) for fee in matched_fees), dtype=float, count=count
+    )
+    cd = np.fromiter(
+        (float(fee.get("cd_amount") or 0.0) for fee in matched_fees), dtype=float, count=count
+    )
+
+    # Per-bucket sums/counts in one pass each instead of per-fee dict updates.
+    size = len(TOLERANCE_BUCKETS)
+    # astype: bincount returns ints for empty input even with float weights.
+    le_sums = np.bincount(buckets, weights=le, minlength=size).astype(float).tolist()
+    cd_sums = np.bincount(buckets, weights=cd, minlength=size).astype(float).tolist()
+    counts = np.bincount(buckets, minlength=size).tolist()
     bucket_totals: Dict[str, Dict[str, float]] = {
-        "zero": {"le_sum": 0.0, "cd_sum": 0.0, "count": 0},
-        "ten_percent": {"le_sum": 0.0, "cd_sum": 0.0, "count": 0},
-        "unlimited": {"le_sum": 0.0, "cd_sum": 0.0, "count": 0},
+        name: {"le_sum": le_sums[idx], "cd_sum": cd_sums[idx], "count": counts[idx]}
+        for idx, name in enumerate(TOLERANCE_BUCKETS)
     }
 
-    for fee in matched_fees:
-        tol = fee.get("tolerance_category") or "unlimited"
-        tol = tol if tol in bucket_totals else "unlimited"
-        le = float(fee.get("le_amount") or 0.0)
-        cd = float(fee.get("cd_amount") or 0.0)
-        bucket_totals[tol]["le_sum"] += le
-        bucket_totals[tol]["cd_sum"] += cd
-        bucket_totals[tol]["count"] += 1
-
     ten = bucket_totals["ten_percent"]
     limit = round(ten["le_sum"] * 1.10, 2)
     cure = max(0.0, round(ten["cd_sum"] - limit, 2))
@@ -536,55 +673,214 @@ def compute_tolerance_metrics(matched_fees: List[Dict[str, Any]]) -> Dict[str, A
     }
 
 
+@lru_cache(maxsize=4096)
 def _normalize_label_for_key(label: Optional[str]) -> str:
     if not label:
         return ""
     text = label.lower()
-    text = re.sub(r"^\s*\d{2}\s*[-.:)]?\s*", "", text)
-    text = re.sub(r"\bto\b.+$", "", text)
+    text = LEADING_ROW_NUMBER_PATTERN.sub("", text)
+    text = TO_PROVIDER_TAIL_PATTERN.sub("", text)
     text = text.replace("owner’s", "owners").replace("owner's", "owners")
     text = text.replace("fee", "")
-    text = re.sub(r"[^a-z0-9]+", " ", text)
-    text = re.sub(r"\s+", " ", text).strip()
+    text = NON_ALNUM_PATTERN.sub(" ", text)
+    text = WHITESPACE_PATTERN.sub(" ", text).strip()
     return text
 
 
-def _build_cd_label_index(cd_record: dict) -> Dict[str, Dict[str, Any]]:
-    index: Dict[str, Dict[str, Any]] = {}
+def _build_cd_label_index(cd_record: dict) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """CD line items keyed by (section, normalized label), with amounts summed by payer."""
+    index: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    normalize = _normalize_label_for_key
+    for sec, item in _iter_section_items(cd_record.get("closing_cost_details")):
+        label = item.get("label") or ""
+        key = (sec, normalize(label))
+        entry = index.get(key)
+        if entry is None:
+            entry = index[key] = {
+                "section": sec,
+                "label": label,
+                "borrower": 0.0,
+                "seller": 0.0,
+                "other": 0.0,
+            }
+        amount = float(item.get("amount") or 0.0)
+        sub_label = (item.get("sub_label") or "").lower()
+        if sub_label.startswith("borrower_paid"):
+            entry["borrower"] += amount
+        elif sub_label.startswith("seller_paid"):
+            entry["seller"] += amount
+        elif sub_label == "paid_by_others":
+            entry["other"] += amount
+    return index
+
 
-    def section_items(sec: str) -> List[dict]:
-        bag = "loan_costs" if sec in {"A", "B", "C"} else "other_costs"
-        return (
-            cd_record.get("closing_cost_details", {})
-            .get(bag, {})
-            .get(sec, {})
-            .get("items", [])
-            or []
+def _build_cd_token_index(
+    cd_index: Dict[Tuple[str, str], Dict[str, Any]],
+) -> Dict[str, Tuple[List[str], Dict[str, List[int]]]]:
+    """Per section: normalized CD labels (index order) and a token -> label positions map."""
+    token_index: Dict[str, Tuple[List[str], Dict[str, List[int]]]] = {}
+    for section, norm_label in cd_index:
+        labels, postings = token_index.setdefault(section, ([], defaultdict(list)))
+        for token in set(norm_label.split()):
+            postings[token].append(len(labels))
+        labels.append(norm_label)
+    return token_index
+
+
+def _fuzzy_find_cd_label(
+    token_index: Dict[str, Tuple[List[str], Dict[str, List[int]]]],
+    section: str,
+    norm_target: str,
+    score_cutoff: float = 80,
+) -> Optional[str]:
+    """
+    Best token_set_ratio match for `norm_target` among the section's CD labels.
+    Labels sharing a token with the target are scored first; the rest of the section
+    is only scanned when none of those clears the cutoff.
+    """
+    if section not in token_index:
+        return None
+    labels, postings = token_index[section]
+    candidate_ids = sorted(
+        {pos for token in set(norm_target.split()) for pos in postings.get(token, ())}
+    )
+    candidates = [labels[pos] for pos in candidate_ids]
+    match = process.extractOne(
+        norm_target, candidates, scorer=fuzz.token_set_ratio, score_cutoff=score_cutoff
+    )
+    if match is None and len(candidates) < len(labels):
+        chosen = set(candidate_ids)
+        rest = [label for pos, label in enumerate(labels) if pos not in chosen]
+        match = process.extractOne(
+            norm_target, rest, scorer=fuzz.token_set_ratio, score_cutoff=score_cutoff
         )
+    return match[0] if match else None
+
+
+# Fees paired locally skip the LLM; only the unresolved remainder is sent to Gemini.
+LOCAL_MATCH_FUZZY_CUTOFF = float(os.getenv("FEE_MATCH_FUZZY_CUTOFF", "90"))
+PROVIDER_TAIL_PATTERN = re.compile(r"\s+to\s+([^\d]+)$", re.IGNORECASE)
+FEE_SECTION_ORDER = {sec: idx for idx, (sec, _) in enumerate(FEE_SECTIONS)}
+
+
+def _split_fee_label(label: str) -> Tuple[str, Optional[str]]:
+    """'01 Appraisal Fee to Acme Inc.' -> ('Appraisal Fee', 'Acme Inc.')."""
+    text = LEADING_ROW_NUMBER_PATTERN.sub("", label)
+    provider = None
+    match = PROVIDER_TAIL_PATTERN.search(text)
+    if match:
+        provider = match.group(1).strip() or None
+        text = text[: match.start()]
+    return WHITESPACE_PATTERN.sub(" ", text).strip(), provider
+
+
+def _local_matched_fee(section: str, le_item: dict, cd_item: dict, confidence: float) -> MatchedFee:
+    le_label, cd_label = le_item.get("label"), cd_item.get("label")
+    fee_name, provider = _split_fee_label(le_label or cd_label or "")
+    if provider is None and cd_label:
+        provider = _split_fee_label(cd_label)[1]
+    return MatchedFee(
+        fee_name=fee_name or le_label or cd_label or "",
+        section=section,
+        le_amount=le_item.get("amount"),
+        cd_amount=cd_item.get("amount"),
+        le_label=le_label,
+        cd_label=cd_label,
+        match_confidence=confidence,
+        # Placeholder: _finalize_fee_comparison classifies every match once
+        # chosen_from_list is settled.
+        tolerance_category="unlimited",
+        provider_name=provider,
+    )
 
-    for sec in ["A", "B", "C", "E", "F", "G", "H"]:
-        for item in section_items(sec):
-            label = item.get("label") or ""
-            key = f"{sec}:{_normalize_label_for_key(label)}"
-            entry = index.setdefault(
-                key,
-                {
-                    "section": sec,
-                    "label": label,
-                    "borrower": 0.0,
-                    "seller": 0.0,
-                    "other": 0.0,
-                },
+
+def _pair_fees_locally(
+    le_sections: Dict[str, List[dict]],
+    cd_sections: Dict[str, List[dict]],
+) -> Tuple[List[MatchedFee], Dict[str, List[dict]], Dict[str, List[dict]]]:
+    """
+    Pair LE and CD fees within each section without the LLM: unique normalized labels
+    first, then a two-way fuzzy score >= LOCAL_MATCH_FUZZY_CUTOFF (best scores first).
+    Returns the matches plus the LE/CD items still unpaired, for the LLM to resolve.
+    """
+    matched: List[MatchedFee] = []
+    le_left: Dict[str, List[dict]] = {}
+    cd_left: Dict[str, List[dict]] = {}
+    for key, le_items in le_sections.items():
+        cd_items = cd_sections.get(key, [])
+        section = key.removeprefix("section_")
+        le_keys = [_normalize_label_for_key(item.get("label")) for item in le_items]
+        cd_keys = [_normalize_label_for_key(item.get("label")) for item in cd_items]
+
+        # Exact: a normalized label that occurs once on each side.
+        le_counts, cd_counts = Counter(le_keys), Counter(cd_keys)
+        cd_unique = {k: j for j, k in enumerate(cd_keys) if k and cd_counts[k] == 1}
+        pairs: Dict[int, Tuple[int, float]] = {
+            i: (cd_unique[k], 1.0)
+            for i, k in enumerate(le_keys)
+            if k and le_counts[k] == 1 and k in cd_unique
+        }
+
+        # Fuzzy: greedy over the remaining unique labels, highest score first. Repeated
+        # labels, and labels whose tokens sit inside several labels on the other side
+        # ("Recording Fees" vs "... - Deed" / "... - Mortgage"), are ambiguous and always
+        # go to the LLM.
+        taken_cd = {j for j, _ in pairs.values()}
+        le_tokens = [set(k.split()) for k in le_keys]
+        cd_tokens = [set(k.split()) for k in cd_keys]
+        free_le = [
+            i
+            for i, k in enumerate(le_keys)
+            if k
+            and le_counts[k] == 1
+            and i not in pairs
+            and sum(le_tokens[i] <= other for other in cd_tokens) <= 1
+        ]
+        free_cd = [
+            j
+            for j, k in enumerate(cd_keys)
+            if k
+            and cd_counts[k] == 1
+            and j not in taken_cd
+            and sum(cd_tokens[j] <= other for other in le_tokens) <= 1
+        ]
+        if free_le and free_cd:
+            le_queries = [le_keys[i] for i in free_le]
+            cd_choices = [cd_keys[j] for j in free_cd]
+            # token_set_ratio alone scores 100 whenever one label's tokens are a subset
+            # of the other's; token_sort_ratio keeps the extra words in play.
+            scores = np.minimum(
+                process.cdist(
+                    le_queries, cd_choices, scorer=fuzz.token_set_ratio, dtype=np.float64
+                ),
+                process.cdist(
+                    le_queries, cd_choices, scorer=fuzz.token_sort_ratio, dtype=np.float64
+                ),
             )
-            amount = float(item.get("amount") or 0.0)
-            sub_label = (item.get("sub_label") or "").lower()
-            if sub_label.startswith("borrower_paid"):
-                entry["borrower"] += amount
-            elif sub_label.startswith("seller_paid"):
-                entry["seller"] += amount
-            elif sub_label == "paid_by_others":
-                entry["other"] += amount
-    return index
+            used_rows: set = set()
+            used_cols: set = set()
+            for flat in np.argsort(-scores, axis=None, kind="stable"):
+                row, col = divmod(int(flat), len(free_cd))
+                score = float(scores[row, col])
+                if score < LOCAL_MATCH_FUZZY_CUTOFF or not score:
+                    break
+                if row in used_rows or col in used_cols:
+                    continue
+                used_rows.add(row)
+                used_cols.add(col)
+                pairs[free_le[row]] = (free_cd[col], round(score / 100.0, 2))
+
+        for i in sorted(pairs):
+            j, confidence = pairs[i]
+            le_item, cd_item = le_items[i], cd_items[j]
+            # Same exclusion the LLM applies: nothing borrower-paid on either side.
+            if not le_item.get("amount") and not cd_item.get("amount"):
+                continue
+            matched.append(_local_matched_fee(section, le_item, cd_item, confidence))
+        paired_cd = {j for j, _ in pairs.values()}
+        le_left[key] = [item for i, item in enumerate(le_items) if i not in pairs]
+        cd_left[key] = [item for j, item in enumerate(cd_items) if j not in paired_cd]
+    return matched, le_left, cd_left
 
 
 PDF_COLOR_SCHEME = {
@@ -611,11 +907,15 @@ PDF_COLOR_SCHEME = {
 }
 
 
-def build_fee_diff_summary(matched_fees: List[dict]) -> List[Dict[str, Any]]:
+def _to_dict_list(fees: List[Any]) -> List[Dict[str, Any]]:
+    """Normalize fees to dicts once; models are shallow-copied from their field storage."""
+    return [fee if isinstance(fee, dict) else dict(fee.__dict__) for fee in fees]
+
+
+def build_fee_diff_summary(matched_fees: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Derive per-fee difference metadata for downstream consumers."""
     summary: List[Dict[str, Any]] = []
-    for fee in matched_fees:
-        fee_dict = fee if isinstance(fee, dict) else fee.dict()  # type: ignore[arg-type]
+    for fee_dict in matched_fees:
         le_amount = fee_dict.get("le_amount")
         cd_amount = fee_dict.get("cd_amount")
         reclassified_to = fee_dict.get("reclassified_to")
@@ -664,108 +964,64 @@ def build_fee_diff_summary(matched_fees: List[dict]) -> List[Dict[str, Any]]:
     return summary
 
 
-def _normalize_text(value: Optional[str]) -> str:
-    if not value:
-        return ""
-    return re.sub(r"[^a-z0-9]+", "", value.lower())
+def _normalize_amount_digits(value: Optional[float]) -> Optional[str]:
+    if value is None:
+        return None
+    formatted = f"{float(value):,.2f}"
+    digits = NON_DIGIT_PATTERN.sub("", formatted)
+    return digits or None
 
 
-def _normalize_for_fuzz(value: Optional[str]) -> str:
-    if not value:
-        return ""
-    text = value.lower()
-    text = re.sub(r"\s+", " ", text)
-    return text.strip()
+# Off by default: a typical LE/CD extracts serially in milliseconds, and each worker
+# costs a process. Set PDF_EXTRACT_WORKERS > 1 for large scanned packages.
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", "1"))
 
 
-def _tokenize_text(value: Optional[str]) -> List[str]:
-    if not value:
-        return []
-    return re.findall(r"[a-z0-9]+", value.lower())
+@lru_cache(maxsize=1)
+def get_pdf_page_pool() -> Optional[ProcessPoolExecutor]:
+    if PDF_EXTRACT_WORKERS <= 1:
+        return None
+    # Forking a threaded process (event loop plus threadpool) can deadlock, so workers
+    # come from forkserver/spawn. The forkserver preloads only pdf_layout, so each
+    # worker starts without the API's imports.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["fintrid_backend.pdf_layout"])
+    else:
+        context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=context)
 
 
-def _normalize_amount_digits(value: Optional[float]) -> Optional[str]:
-    if value is None:
-        return None
-    formatted = f"{float(value):,.2f}"
-    digits = re.sub(r"[^0-9]", "", formatted)
-    return digits or None
+def warm_pdf_page_pool() -> None:
+    """Start every page worker up front so the first highlight request does not."""
+    pool = get_pdf_page_pool()
+    if pool is not None:
+        for future in [pool.submit(os.getpid) for _ in range(PDF_EXTRACT_WORKERS)]:
+            future.result()
 
 
-def _cluster_words_into_lines(words: List[dict], y_tol: float = 3.0) -> List[Dict[str, Any]]:
-    lines: List[Dict[str, Any]] = []
-    for word in sorted(words, key=lambda w: (w["top"], w["x0"])):
-        matched_line: Optional[Dict[str, Any]] = None
-        for line in lines:
-            if abs(line["top"] - word["top"]) <= y_tol:
-                matched_line = line
-                break
-        if matched_line is None:
-            matched_line = {
-                "top": word["top"],
-                "bottom": word["bottom"],
-                "x0": word["x0"],
-                "x1": word["x1"],
-                "words": [word],
-            }
-            lines.append(matched_line)
-        else:
-            matched_line["top"] = min(matched_line["top"], word["top"])
-            matched_line["bottom"] = max(matched_line["bottom"], word["bottom"])
-            matched_line["x0"] = min(matched_line["x0"], word["x0"])
-            matched_line["x1"] = max(matched_line["x1"], word["x1"])
-            matched_line["words"].append(word)
-
-    for line in lines:
-        ordered_words = sorted(line["words"], key=lambda w: w["x0"])
-        text = " ".join(w["text"] for w in ordered_words).strip()
-        line["text"] = text
-        line["norm_text"] = _normalize_text(text)
-        line["digits"] = re.sub(r"[^0-9]", "", text)
-        line["fuzzy_text"] = _normalize_for_fuzz(text)
-        line["tokens"] = _tokenize_text(text)
-        line["mid_y"] = (line["top"] + line["bottom"]) / 2
-    return lines
+def shutdown_pdf_page_pool() -> None:
+    if get_pdf_page_pool.cache_info().currsize:
+        pool = get_pdf_page_pool()
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+        get_pdf_page_pool.cache_clear()
 
 
 def _extract_pdf_pages(pdf_path: Path) -> List[Dict[str, Any]]:
-    pages: List[Dict[str, Any]] = []
     with pdfplumber.open(str(pdf_path)) as pdf:
-        for index, page in enumerate(pdf.pages):
-            words = page.extract_words(
-                x_tolerance=1.5, y_tolerance=0.5, keep_blank_chars=False, use_text_flow=True
-            )
-            lines = _cluster_words_into_lines(words)
-            section_markers: List[Dict[str, Any]] = []
-            for line in lines:
-                text = (line.get("text") or "").strip()
-                match = SECTION_HEADER_PATTERN.match(text)
-                if match:
-                    section_markers.append(
-                        {
-                            "section": match.group(1).upper(),
-                            "top": line["top"],
-                        }
-                    )
-            section_ranges: Dict[str, Tuple[float, float]] = {}
-            for idx, marker in enumerate(section_markers):
-                start = marker["top"]
-                end = (
-                    section_markers[idx + 1]["top"]
-                    if idx + 1 < len(section_markers)
-                    else page.height
-                )
-                section_ranges[marker["section"]] = (start, end)
-            pages.append(
-                {
-                    "index": index,
-                    "width": page.width,
-                    "height": page.height,
-                    "lines": lines,
-                    "section_ranges": section_ranges,
-                }
-            )
-    return pages
+        page_count = len(pdf.pages)
+        pool = get_pdf_page_pool() if page_count > 1 else None
+        if pool is None:
+            return [_extract_page_layout(page, index) for index, page in enumerate(pdf.pages)]
+
+    # Word extraction and line clustering are CPU-bound, so pages are spread across
+    # processes rather than threads: one contiguous run of pages per task, and at most
+    # min(workers, page_count) tasks. map() keeps results in page order.
+    size = -(-page_count // min(PDF_EXTRACT_WORKERS, page_count))
+    chunks = [range(start, min(start + size, page_count)) for start in range(0, page_count, size)]
+    results = pool.map(_extract_pdf_page_range, repeat(str(pdf_path)), chunks)
+    return [page for chunk in results for page in chunk]
 
 
 def _resolve_color(doc_type: str, diff_type: str) -> Dict[str, Any]:
@@ -782,195 +1038,267 @@ def _resolve_color(doc_type: str, diff_type: str) -> Dict[str, Any]:
     }
 
 
+def _highlight_payload(
+    base_payload: Dict[str, Any],
+    label: Any,
+    amount: Any,
+    diff_type: str,
+    doc_type: str,
+    row_hint: Optional[str],
+) -> Dict[str, Any]:
+    payload = base_payload.copy()
+    payload["label"] = label
+    payload["amount"] = amount
+    payload["diff_type"] = diff_type
+    payload["doc_type"] = doc_type
+    payload["row_hint"] = row_hint
+    return payload
+
+
 def _build_highlight_requests(diff_summary: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
-    requests: Dict[str, List[Dict[str, Any]]] = {"loan_estimate": [], "closing_disclosure": []}
+    le_out: List[Dict[str, Any]] = []
+    cd_out: List[Dict[str, Any]] = []
     for entry in diff_summary:
         diff_type = entry.get("diff_type")
         if not diff_type:
             continue
 
+        fee_name = entry.get("fee_name")
+        le_label, cd_label = entry.get("le_label"), entry.get("cd_label")
         base_payload = {
-            "fee_name": entry.get("fee_name"),
+            "fee_name": fee_name,
             "provider_name": entry.get("provider_name"),
             "section": entry.get("section"),
             "tolerance_category": entry.get("tolerance_category"),
         }
 
         row_hint: Optional[str] = None
-        for candidate in [entry.get("cd_label"), entry.get("le_label"), entry.get("fee_name")]:
+        for candidate in (cd_label, le_label, fee_name):
             if not candidate:
                 continue
-            match = re.match(r"^\s*(\d{2})\b", candidate)
+            match = ROW_HINT_PATTERN.match(candidate)
             if match:
                 row_hint = match.group(1)
                 break
 
         if diff_type == "reclassified_off_borrower":
-            requests["loan_estimate"].append(
-                {
-                    **base_payload,
-                    "label": entry.get("le_label"),
-                    "amount": entry.get("le_amount"),
-                    "diff_type": "decrease",
-                    "doc_type": "loan_estimate",
-                    "row_hint": row_hint,
-                }
+            le_out.append(
+                _highlight_payload(
+                    base_payload,
+                    le_label,
+                    entry.get("le_amount"),
+                    "decrease",
+                    "loan_estimate",
+                    row_hint,
+                )
             )
-            requests["closing_disclosure"].append(
-                {
-                    **base_payload,
-                    "label": entry.get("cd_label"),
-                    "amount": entry.get("reclassified_amount") or entry.get("cd_amount"),
-                    "diff_type": "decrease",
-                    "doc_type": "closing_disclosure",
-                    "row_hint": row_hint,
-                }
+            cd_out.append(
+                _highlight_payload(
+                    base_payload,
+                    cd_label,
+                    entry.get("reclassified_amount") or entry.get("cd_amount"),
+                    "decrease",
+                    "closing_disclosure",
+                    row_hint,
+                )
             )
             continue
 
-        if diff_type == "missing_on_cd":
-            payload = {
-                **base_payload,
-                "label": entry.get("le_label"),
-                "amount": entry.get("le_amount"),
-                "diff_type": diff_type,
-                "doc_type": "loan_estimate",
-                "row_hint": row_hint,
-            }
-            requests["loan_estimate"].append(payload)
-        elif diff_type == "new_on_cd":
-            payload = {
-                **base_payload,
-                "label": entry.get("cd_label"),
-                "amount": entry.get("cd_amount"),
-                "diff_type": diff_type,
-                "doc_type": "closing_disclosure",
-                "row_hint": row_hint,
-            }
-            requests["closing_disclosure"].append(payload)
-        else:
-            requests["loan_estimate"].append(
-                {
-                    **base_payload,
-                    "label": entry.get("le_label"),
-                    "amount": entry.get("le_amount"),
-                    "diff_type": diff_type,
-                    "doc_type": "loan_estimate",
-                    "row_hint": row_hint,
-                }
+        # missing_on_cd only marks the LE, new_on_cd only the CD, anything else both.
+        if diff_type != "new_on_cd":
+            le_out.append(
+                _highlight_payload(
+                    base_payload,
+                    le_label,
+                    entry.get("le_amount"),
+                    diff_type,
+                    "loan_estimate",
+                    row_hint,
+                )
             )
-            requests["closing_disclosure"].append(
-                {
-                    **base_payload,
-                    "label": entry.get("cd_label"),
-                    "amount": entry.get("cd_amount"),
-                    "diff_type": diff_type,
-                    "doc_type": "closing_disclosure",
-                    "row_hint": row_hint,
-                }
+        if diff_type != "missing_on_cd":
+            cd_out.append(
+                _highlight_payload(
+                    base_payload,
+                    cd_label,
+                    entry.get("cd_amount"),
+                    diff_type,
+                    "closing_disclosure",
+                    row_hint,
+                )
             )
-    return requests
+    return {"loan_estimate": le_out, "closing_disclosure": cd_out}
+
+
+def _build_line_table(pages: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Column-wise view of every scorable line across `pages`, in page/line order."""
+    refs: List[Tuple[Dict[str, Any], Dict[str, Any]]] = []
+    page_pos: List[int] = []
+    for position, page in enumerate(pages):
+        for line in page["lines"]:
+            if line.get("norm_text"):
+                refs.append((page, line))
+                page_pos.append(position)
+
+    token_lines: Dict[str, List[int]] = defaultdict(list)
+    for position, (_, line) in enumerate(refs):
+        for token in set(line.get("tokens") or ()):
+            token_lines[token].append(position)
+
+    count = len(refs)
+    line_page = np.array(page_pos, dtype=np.intp)
+    widths = np.array([page.get("width") or 0.0 for page in pages], dtype=float)[line_page]
+    x1 = np.fromiter((line.get("x1", 0.0) for _, line in refs), dtype=float, count=count)
+    mid_y = np.fromiter(
+        (np.nan if line.get("mid_y") is None else line["mid_y"] for _, line in refs),
+        dtype=float,
+        count=count,
+    )
+    positive_width = widths > 0
+    right_ratio = np.divide(x1, widths, out=np.zeros(count), where=positive_width)
+    return {
+        "pages": pages,
+        "refs": refs,
+        "line_page": line_page,
+        "mid_y": mid_y,
+        "fuzzy_texts": [line.get("fuzzy_text", "") for _, line in refs],
+        "digits": [line.get("digits") or "" for _, line in refs],
+        "token_lines": {token: np.array(hits) for token, hits in token_lines.items()},
+        "right_aligned": positive_width & (right_ratio >= 0.7),
+        "digit_masks": {},
+        "section_deltas": {},
+    }
+
+
+def _fuzzy_score_rows(table: Dict[str, Any], norm_targets: List[str]) -> Dict[str, np.ndarray]:
+    """partial_ratio of each normalized target against every line, in one cdist call."""
+    unique = list(dict.fromkeys(t for t in norm_targets if t))
+    if not unique or not table["refs"]:
+        return {}
+    matrix = process.cdist(
+        unique, table["fuzzy_texts"], scorer=fuzz.partial_ratio, dtype=np.float64
+    )
+    return dict(zip(unique, matrix))
 
 
-def _score_line_for_targets(
-    line: Dict[str, Any],
+def _line_digit_mask(table: Dict[str, Any], amount_digits: str) -> np.ndarray:
+    mask = table["digit_masks"].get(amount_digits)
+    if mask is None:
+        mask = table["digit_masks"][amount_digits] = np.fromiter(
+            (amount_digits in digits for digits in table["digits"]),
+            dtype=bool,
+            count=len(table["digits"]),
+        )
+    return mask
+
+
+def _line_section_delta(table: Dict[str, Any], section_hint: str) -> np.ndarray:
+    """+12 for lines inside the page's range for the section, -12 outside, 0 if no range."""
+    # Cached under the raw hint; page section_ranges are already keyed by uppercase letter,
+    # so the hint is only uppercased once, on a miss.
+    delta = table["section_deltas"].get(section_hint)
+    if delta is None:
+        section = section_hint.upper()
+        bounds = np.full((len(table["pages"]), 2), np.nan)
+        for position, page in enumerate(table["pages"]):
+            rng = (page.get("section_ranges") or {}).get(section)
+            if rng:
+                bounds[position] = rng
+        line_bounds = bounds[table["line_page"]]
+        mid_y = table["mid_y"]
+        known = ~np.isnan(line_bounds[:, 0]) & ~np.isnan(mid_y)
+        inside = (line_bounds[:, 0] - 6 <= mid_y) & (mid_y <= line_bounds[:, 1] + 6)
+        delta = np.where(known, np.where(inside, 12.0, -12.0), 0.0)
+        table["section_deltas"][section_hint] = delta
+    return delta
+
+
+def _find_best_line_match_batched(
+    table: Dict[str, Any],
+    ratio_rows: Dict[str, np.ndarray],
     primary_targets: List[str],
     secondary_targets: List[str],
     amount_digits: Optional[str],
     *,
-    page_width: Optional[float] = None,
-    row_hint: Optional[str] = None,
     section_hint: Optional[str] = None,
-    page_section_ranges: Optional[Dict[str, Tuple[float, float]]] = None,
-) -> float:
-    score = 0.0
-    fuzzy_text = line.get("fuzzy_text", "")
-    norm_text = line.get("norm_text", "")
+    row_hint: Optional[str] = None,
+    min_score: float = 60.0,
+) -> Optional[Dict[str, Any]]:
+    """
+    Score every line at once and return the best one at or above `min_score`: fuzzy
+    ratios come precomputed from _fuzzy_score_rows and the bonuses are NumPy masks over
+    the line table.
+    """
+    refs = table["refs"]
+    if not refs:
+        return None
+    token_lines = table["token_lines"]
+    score = np.zeros(len(refs))
 
     for target in primary_targets:
         norm_target = _normalize_for_fuzz(target)
         if not norm_target:
             continue
-        ratio = fuzz.partial_ratio(norm_target, fuzzy_text)
-        if ratio > score:
-            score = ratio
-
+        np.maximum(score, ratio_rows[norm_target], out=score)
         target_tokens = _tokenize_text(target)
-        if target_tokens and line.get("tokens"):
-            token_hits = sum(1 for token in target_tokens if token in line["tokens"])
-            if token_hits:
-                score += min(20, token_hits * 6)
+        if target_tokens:
+            hits = np.zeros(len(refs))
+            for token in target_tokens:
+                positions = token_lines.get(token)
+                if positions is not None:
+                    hits[positions] += 1
+            score += np.minimum(20, hits * 6)
 
     for secondary in secondary_targets:
         norm_secondary = _normalize_for_fuzz(secondary)
         if not norm_secondary:
             continue
-        ratio = fuzz.partial_ratio(norm_secondary, fuzzy_text)
-        score = max(score, ratio * 0.85)
-
-    if amount_digits and amount_digits in (line.get("digits") or ""):
-        score += 25
-        if page_width and page_width > 0:
-            right_ratio = (line.get("x1", 0.0) / page_width) if page_width else 0.0
-            if right_ratio >= 0.7:
-                score += 12
-
-    if row_hint and row_hint in line.get("tokens", []):
-        score += 10
-
-    if section_hint and page_section_ranges:
-        rng = page_section_ranges.get(section_hint.upper())
-        mid = line.get("mid_y")
-        if rng and mid is not None:
-            if rng[0] - 6 <= mid <= rng[1] + 6:
-                score += 12
-            else:
-                score -= 12
+        np.maximum(score, ratio_rows[norm_secondary] * 0.85, out=score)
 
-    # penalty if no primary match context
-    if score < 50 and not amount_digits:
-        score *= 0.8
+    if amount_digits:
+        digit_mask = _line_digit_mask(table, amount_digits)
+        score[digit_mask] += 25
+        score[digit_mask & table["right_aligned"]] += 12
 
-    return score
+    if row_hint:
+        positions = token_lines.get(row_hint)
+        if positions is not None:
+            score[positions] += 10
 
+    if section_hint:
+        score += _line_section_delta(table, section_hint)
 
-def _find_best_line_match(
-    pages: List[Dict[str, Any]],
-    primary_targets: List[str],
-    secondary_targets: List[str],
-    amount_digits: Optional[str],
-    *,
-    section_hint: Optional[str] = None,
-    row_hint: Optional[str] = None,
-    min_score: float = 60.0,
-) -> Optional[Dict[str, Any]]:
-    best: Optional[Dict[str, Any]] = None
-    for page in pages:
-        for line in page["lines"]:
-            if not line.get("norm_text"):
-                continue
-            score = _score_line_for_targets(
-                line,
-                primary_targets,
-                secondary_targets,
-                amount_digits,
-                page_width=page.get("width"),
-                row_hint=row_hint,
-                section_hint=section_hint,
-                page_section_ranges=page.get("section_ranges"),
-            )
+    # penalty if no primary match context
+    if not amount_digits:
+        score = np.where(score < 50, score * 0.8, score)
 
-            if score < min_score:
-                continue
+    best = int(np.argmax(score))
+    if score[best] < min_score:
+        return None
+    page, line = refs[best]
+    return {
+        "score": float(score[best]),
+        "page_index": page["index"],
+        "line": line,
+        "page": page,
+        "position": best,
+    }
 
-            if best is None or score > best["score"]:
-                best = {
-                    "score": score,
-                    "page_index": page["index"],
-                    "line": line,
-                    "page": page,
-                }
-    return best
+
+def _locate_amount_line(
+    table: Dict[str, Any], position: int, amount_digits: str
+) -> Optional[Dict[str, Any]]:
+    """First other line on the same page carrying the amount within 3.5pt of `position`."""
+    mid_y = table["mid_y"]
+    line_page = table["line_page"]
+    candidates = (
+        _line_digit_mask(table, amount_digits)
+        & (line_page == line_page[position])
+        & (np.abs(mid_y - mid_y[position]) <= 3.5)
+    )
+    candidates[position] = False
+    hits = np.flatnonzero(candidates)
+    return table["refs"][hits[0]][1] if hits.size else None
 
 
 def _build_annotations(
@@ -980,29 +1308,11 @@ def _build_annotations(
     pages = _extract_pdf_pages(pdf_path)
     annotations: List[Dict[str, Any]] = []
 
-    def locate_amount_line(page: Dict[str, Any], base_line: Dict[str, Any], amount_digits: Optional[str]):
-        if not amount_digits:
-            return None
-        target_mid = base_line.get("mid_y")
-        if target_mid is None:
-            return None
-        for candidate in page["lines"]:
-            if candidate is base_line:
-                continue
-            if amount_digits not in (candidate.get("digits") or ""):
-                continue
-            candidate_mid = candidate.get("mid_y")
-            if candidate_mid is None:
-                continue
-            if abs(candidate_mid - target_mid) <= 3.5:
-                return candidate
-        return None
-
+    prepared = []
     for request in requests:
         label = request.get("label") or request.get("fee_name")
         if not label:
             continue
-        amount_digits = _normalize_amount_digits(request.get("amount"))
         primary_targets = [request.get("label"), request.get("fee_name")]
         secondary_targets = [
             request.get("provider_name"),
@@ -1010,17 +1320,43 @@ def _build_annotations(
             request.get("section"),
             request.get("tolerance_category"),
         ]
-        match = _find_best_line_match(
-            pages,
-            [t for t in primary_targets if t],
-            [t for t in secondary_targets if t],
+        prepared.append(
+            (
+                request,
+                label,
+                [t for t in primary_targets if t],
+                [t for t in secondary_targets if t],
+            )
+        )
+
+    # Fuzzy-score every distinct target against every line in one batched call.
+    table = _build_line_table(pages)
+    ratio_rows = _fuzzy_score_rows(
+        table,
+        [
+            _normalize_for_fuzz(target)
+            for _, _, primary, secondary in prepared
+            for target in primary + secondary
+        ],
+    )
+
+    for request, label, primary_targets, secondary_targets in prepared:
+        amount_digits = _normalize_amount_digits(request.get("amount"))
+        match = _find_best_line_match_batched(
+            table,
+            ratio_rows,
+            primary_targets,
+            secondary_targets,
             amount_digits,
             section_hint=request.get("section"),
             row_hint=request.get("row_hint"),
         )
-        if not match and amount_digits:
-            match = _find_best_line_match(
-                pages,
+        # Without the amount the fallback tops out at 22 (row hint + section), below its
+        # min_score of 35, so it is only worth running when some line carries the digits.
+        if not match and amount_digits and _line_digit_mask(table, amount_digits).any():
+            match = _find_best_line_match_batched(
+                table,
+                ratio_rows,
                 [],
                 [],
                 amount_digits,
@@ -1031,7 +1367,9 @@ def _build_annotations(
         if not match:
             continue
 
-        amount_line = locate_amount_line(match["page"], match["line"], amount_digits)
+        amount_line = (
+            _locate_amount_line(table, match["position"], amount_digits) if amount_digits else None
+        )
 
         color_info = _resolve_color(request["doc_type"], request["diff_type"])
 
@@ -1072,10 +1410,34 @@ def _build_annotations(
     return annotations, pages
 
 
+def _pdf_number(value: float) -> str:
+    text = f"{float(value):.4f}".rstrip("0").rstrip(".")
+    return text if text not in ("", "-0") else "0"
+
+
+def _stamp_boxes(page: Any, boxes: List[Dict[str, Any]]) -> None:
+    """Append stroked highlight rectangles straight to the page's content stream."""
+    ops = ["q", "1.8 w"]
+    for box in boxes:
+        ops.append(" ".join(_pdf_number(c) for c in box["color"]) + " RG")
+        ops.append(
+            " ".join(_pdf_number(box[k]) for k in ("x0", "y0", "width", "height")) + " re S"
+        )
+    ops.append("Q")
+
+    # The original content is wrapped in q/Q so any graphics state it leaves behind
+    # (transforms, clipping) cannot shift the boxes.
+    contents = page.get_contents()
+    original = contents.get_data() if contents is not None else b""
+    stream = DecodedStreamObject()
+    stream.set_data(b"q\n" + original + b"\nQ\n" + "\n".join(ops).encode("ascii") + b"\n")
+    page.replace_contents(stream)
+    page.compress_content_streams()
+
+
 def _draw_annotations(
     source_pdf: Path,
     annotations: List[Dict[str, Any]],
-    pages_meta: List[Dict[str, Any]],
     output_pdf: Path,
 ) -> None:
     reader = PdfReader(str(source_pdf))
@@ -1085,26 +1447,37 @@ def _draw_annotations(
         grouped[annotation["page_index"]].append(annotation)
 
     for index, page in enumerate(reader.pages):
+        page = writer.add_page(page)
         boxes = grouped.get(index)
         if boxes:
-            packet = io.BytesIO()
-            page_meta = pages_meta[index]
-            canv = canvas.Canvas(packet, pagesize=(page_meta["width"], page_meta["height"]))
-            for box in boxes:
-                canv.setStrokeColorRGB(*box["color"])
-                canv.setLineWidth(1.8)
-                canv.rect(box["x0"], box["y0"], box["width"], box["height"], fill=0, stroke=1)
-            canv.save()
-            packet.seek(0)
-            overlay = PdfReader(packet)
-            page.merge_page(overlay.pages[0])
-        writer.add_page(page)
+            _stamp_boxes(page, boxes)
 
     with output_pdf.open("wb") as buffer:
         writer.write(buffer)
 
 
-def generate_pdf_highlights(
+def _highlight_document(
+    source_path: Path,
+    requests: List[Dict[str, Any]],
+    doc_tag: str,
+    now: datetime,
+) -> Optional[Dict[str, Any]]:
+    timestamp = now.strftime("%Y%m%d-%H%M%S")
+    output_path = source_path.with_name(f"{source_path.stem}_annotated_{doc_tag}_{timestamp}.pdf")
+    annotations, pages_meta = _build_annotations(source_path, requests)
+    if not annotations:
+        return None
+    _draw_annotations(source_path, annotations, output_path)
+    return {
+        "source_pdf_path": str(source_path),
+        "highlighted_pdf_path": str(output_path),
+        "page_count": len(pages_meta),
+        "annotation_count": len(annotations),
+        "generated_at": now.isoformat(),
+    }
+
+
+async def generate_pdf_highlights(
     le_pdf_path: Optional[str],
     cd_pdf_path: Optional[str],
     diff_summary: Optional[List[Dict[str, Any]]],
@@ -1120,35 +1493,29 @@ def generate_pdf_highlights(
         }
     }
 
-    timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-
-    if le_pdf_path and requests["loan_estimate"]:
-        source_path = Path(le_pdf_path)
-        output_path = source_path.with_name(f"{source_path.stem}_annotated_LE_{timestamp}.pdf")
-        annotations, pages_meta = _build_annotations(source_path, requests["loan_estimate"])
-        if annotations:
-            _draw_annotations(source_path, annotations, pages_meta, output_path)
-            bundle["loan_estimate"] = {
-                "source_pdf_path": str(source_path),
-                "highlighted_pdf_path": str(output_path),
-                "page_count": len(pages_meta),
-                "annotation_count": len(annotations),
-                "generated_at": datetime.now().isoformat(),
-            }
-
-    if cd_pdf_path and requests["closing_disclosure"]:
-        source_path = Path(cd_pdf_path)
-        output_path = source_path.with_name(f"{source_path.stem}_annotated_CD_{timestamp}.pdf")
-        annotations, pages_meta = _build_annotations(source_path, requests["closing_disclosure"])
-        if annotations:
-            _draw_annotations(source_path, annotations, pages_meta, output_path)
-            bundle["closing_disclosure"] = {
-                "source_pdf_path": str(source_path),
-                "highlighted_pdf_path": str(output_path),
-                "page_count": len(pages_meta),
-                "annotation_count": len(annotations),
-                "generated_at": datetime.now().isoformat(),
-            }
+    # One clock read for both documents: file name stamps and generated_at agree.
+    now = datetime.now()
+
+    # LE and CD are annotated concurrently; each side's page extraction already fans
+    # out over the page pool, so the two documents overlap there as well.
+    jobs = []
+    for doc_type, pdf_path, doc_tag in (
+        ("loan_estimate", le_pdf_path, "LE"),
+        ("closing_disclosure", cd_pdf_path, "CD"),
+    ):
+        if pdf_path and requests[doc_type]:
+            jobs.append(
+                (
+                    doc_type,
+                    run_in_threadpool(
+                        _highlight_document, Path(pdf_path), requests[doc_type], doc_tag, now
+                    ),
+                )
+            )
+    results = await asyncio.gather(*(job for _, job in jobs))
+    for (doc_type, _), result in zip(jobs, results):
+        if result:
+            bundle[doc_type] = result
 
     if not bundle.get("loan_estimate") and not bundle.get("closing_disclosure"):
         return None
@@ -1156,193 +1523,171 @@ def generate_pdf_highlights(
     return bundle
 
 
-async def ai_match_fees(
-    le_record: dict,
+def _finalize_fee_comparison(
+    result_dict: Dict[str, Any],
+    matched_fees: List[Any],
     cd_record: dict,
-    gemini_model: str = "gemini-2.5-pro",
-) -> dict:
-    """
-    Use AI to intelligently match and normalize fees between LE and CD
-    """
-    try:
-        prompt_data = {
-            "loan_estimate": {
-                "section_A": le_record.get("closing_cost_details", {})
-                .get("loan_costs", {})
-                .get("A", {})
-                .get("items", []),
-                "section_B": le_record.get("closing_cost_details", {})
-                .get("loan_costs", {})
-                .get("B", {})
-                .get("items", []),
-                "section_C": le_record.get("closing_cost_details", {})
-                .get("loan_costs", {})
-                .get("C", {})
-                .get("items", []),
-                "section_E": le_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("E", {})
-                .get("items", []),
-                "section_F": le_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("F", {})
-                .get("items", []),
-                "section_G": le_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("G", {})
-                .get("items", []),
-                "section_H": le_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("H", {})
-                .get("items", []),
-            },
-            "closing_disclosure": {
-                "section_A": cd_record.get("closing_cost_details", {})
-                .get("loan_costs", {})
-                .get("A", {})
-                .get("items", []),
-                "section_B": cd_record.get("closing_cost_details", {})
-                .get("loan_costs", {})
-                .get("B", {})
-                .get("items", []),
-                "section_C": cd_record.get("closing_cost_details", {})
-                .get("loan_costs", {})
-                .get("C", {})
-                .get("items", []),
-                "section_E": cd_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("E", {})
-                .get("items", []),
-                "section_F": cd_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("F", {})
-                .get("items", []),
-                "section_G": cd_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("G", {})
-                .get("items", []),
-                "section_H": cd_record.get("closing_cost_details", {})
-                .get("other_costs", {})
-                .get("H", {})
-                .get("items", []),
-            },
+) -> Dict[str, Any]:
+    """Tolerance classification, reclassification, metrics and diff rows for AI matches."""
+    matched_fee_dicts: List[Dict[str, Any]] = []
+    for fee_dict in _to_dict_list(matched_fees):
+        chosen_flag = fee_dict.get("chosen_from_list")
+        if chosen_flag is None:
+            if fee_dict.get("le_amount") is None:
+                chosen_flag = False
+            elif float(fee_dict.get("match_confidence") or 0.0) < 0.6:
+                chosen_flag = False
+            else:
+                chosen_flag = True
+        fee_dict["chosen_from_list"] = chosen_flag
+        fee_dict["changed_circumstance"] = bool(fee_dict.get("changed_circumstance"))
+        tolerance = classify_fee_tolerance(
+            fee_dict.get("section"),
+            fee_dict.get("le_label") or fee_dict.get("cd_label") or fee_dict.get("fee_name"),
+            fee_dict.get("chosen_from_list"),
+            fee_dict.get("changed_circumstance"),
+        )
+        fee_dict["tolerance_category"] = tolerance
+        matched_fee_dicts.append(fee_dict)
+
+    cd_index = _build_cd_label_index(cd_record)
+    cd_token_index = _build_cd_token_index(cd_index)
+
+    def _mark_reclassified_off_borrower(matched: List[Dict[str, Any]]) -> None:
+        for entry in matched:
+            if entry.get("le_amount") is None or entry.get("cd_amount") is not None:
+                continue
+            section = (entry.get("section") or "").upper()
+            if not section:
+                continue
+            label = entry.get("le_label") or entry.get("cd_label") or entry.get("fee_name")
+            if not label:
+                continue
+            norm_label = _normalize_label_for_key(label)
+            cd_entry = cd_index.get((section, norm_label))
+            if not cd_entry:
+                best_label = _fuzzy_find_cd_label(cd_token_index, section, norm_label)
+                if best_label is not None:
+                    cd_entry = cd_index.get((section, best_label))
+            if not cd_entry:
+                continue
+            if cd_entry["seller"] > 0:
+                reclass_dest = "seller"
+            elif cd_entry["other"] > 0:
+                reclass_dest = "other"
+            else:
+                continue
+
+            entry["reclassified_to"] = reclass_dest
+            entry["reclassified_amount"] = cd_entry[reclass_dest]
+            if cd_entry.get("label"):
+                entry["cd_label"] = cd_entry["label"]
+
+    _mark_reclassified_off_borrower(matched_fee_dicts)
+
+    result_dict["matched_fees"] = matched_fee_dicts
+
+    tolerance_metrics = compute_tolerance_metrics(matched_fee_dicts)
+    result_dict["summary"]["tolerance_summary"] = tolerance_metrics["bucket_totals"]
+    result_dict["summary"]["ten_percent_test"] = tolerance_metrics["ten_percent_test"]
+    if tolerance_metrics["ten_percent_test"]["cure_required"] > 0:
+        result_dict["summary"]["lender_credit_recommendation"] = {
+            "recommended_credit": tolerance_metrics["ten_percent_test"]["cure_required"],
+            "note": "Apply lender credit to cure 10% tolerance excess.",
         }
 
-        llm = ChatGoogleGenerativeAI(model=gemini_model, temperature=0.0)
-        structured_llm = llm.with_structured_output(
-            TRIDComparison, method="function_calling"
-        )
+    result_dict["diff_summary"] = build_fee_diff_summary(matched_fee_dicts)
+    return result_dict
+
+
+# Caps in-flight Gemini calls (extraction, fee matching, summaries) across all requests,
+# so many concurrent uploads queue here instead of tripping the provider's rate limits.
+GEMINI_SEMAPHORE = asyncio.Semaphore(int(os.getenv("GEMINI_CONCURRENCY", "4")))
 
-        prompt = f"""Match the BORROWER-PAID fees between Loan Estimate and Closing Disclosure.
+
+@lru_cache(maxsize=8)
+def get_structured_llm(model_name: str, temperature: float, schema: type) -> Any:
+    """Gemini client bound to `schema`, built once per (model, temperature, schema)."""
+    llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
+    return llm.with_structured_output(schema, method="function_calling")
+
+
+async def _llm_match_fees(
+    le_sections: Dict[str, List[dict]],
+    cd_sections: Dict[str, List[dict]],
+    gemini_model: str,
+) -> TRIDComparison:
+    structured_llm = get_structured_llm(gemini_model, 0.0, TRIDComparison)
+
+    prompt = f"""Match the BORROWER-PAID fees between Loan Estimate and Closing Disclosure.
 
 LOAN ESTIMATE FEES (all borrower-paid):
-{json.dumps(prompt_data["loan_estimate"], indent=2)}
+{compact_json(le_sections)}
 
-CLOSING DISCLOSURE FEES (filter for borrower-paid only):
-{json.dumps(prompt_data["closing_disclosure"], indent=2)}
+CLOSING DISCLOSURE FEES (borrower-paid only; at-closing + before-closing already summed):
+{compact_json(cd_sections)}
 
 INSTRUCTIONS:
 1. For LE: Use the "amount" field directly (all LE fees are borrower-paid)
-2. For CD: ONLY include items where sub_label contains "borrower_paid"
-3. For CD: SUM the amounts from "borrower_paid_at_closing" + "borrower_paid_before_closing" for each fee
-4. Mark is_new=true if fee appears in CD but not LE
-5. Exclude any fees with null or zero borrower amounts
-6. Leave summary as empty dict {{}}
+2. For CD: Use the "amount" field directly (it is already the borrower-paid total per fee)
+3. Mark is_new=true if fee appears in CD but not LE
+4. Exclude any fees with null or zero borrower amounts
+5. Leave summary as empty dict {{}}
 
 Return a TRIDComparison with matched_fees list and empty summary.
 """
 
-        result: TRIDComparison = await run_in_threadpool(
-            structured_llm.invoke,
+    # Same fee lists (a re-run, or re-uploaded documents) reuse the stored match.
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    cache_key = f"match:{prompt_hash}:{gemini_model}:{MATCHING_CACHE_VERSION}"
+    cached = await run_in_threadpool(llm_cache_get, cache_key)
+    if cached is not None:
+        return TRIDComparison.model_validate_json(cached)
+
+    async with GEMINI_SEMAPHORE:
+        result = await structured_llm.ainvoke(
             [
                 SystemMessage(content=MATCHING_SYSTEM),
                 HumanMessage(content=prompt),
-            ],
+            ]
         )
+    await run_in_threadpool(
+        llm_cache_put,
+        cache_key,
+        orjson.dumps(result.model_dump(include={"matched_fees", "summary"})).decode(),
+    )
+    return result
 
-        result_dict = result.dict()
-        if not isinstance(result_dict.get("summary"), dict):
-            result_dict["summary"] = {}
-
-        matched_fee_dicts: List[Dict[str, Any]] = []
-        for fee in result_dict.get("matched_fees", []):
-            fee_dict = fee if isinstance(fee, dict) else fee.dict()  # type: ignore[arg-type]
-            chosen_flag = fee_dict.get("chosen_from_list")
-            if chosen_flag is None:
-                if fee_dict.get("le_amount") is None:
-                    chosen_flag = False
-                elif float(fee_dict.get("match_confidence") or 0.0) < 0.6:
-                    chosen_flag = False
-                else:
-                    chosen_flag = True
-            fee_dict["chosen_from_list"] = chosen_flag
-            fee_dict["changed_circumstance"] = bool(fee_dict.get("changed_circumstance"))
-            tolerance = classify_fee_tolerance(
-                fee_dict.get("section"),
-                fee_dict.get("le_label") or fee_dict.get("cd_label") or fee_dict.get("fee_name"),
-                fee_dict.get("chosen_from_list"),
-                fee_dict.get("changed_circumstance"),
-            )
-            fee_dict["tolerance_category"] = tolerance
-            matched_fee_dicts.append(fee_dict)
-
-        cd_index = _build_cd_label_index(cd_record)
-
-        def _mark_reclassified_off_borrower(matched: List[Dict[str, Any]]) -> None:
-            for entry in matched:
-                if entry.get("le_amount") is None or entry.get("cd_amount") is not None:
-                    continue
-                section = (entry.get("section") or "").upper()
-                if not section:
-                    continue
-                label = entry.get("le_label") or entry.get("cd_label") or entry.get("fee_name")
-                if not label:
-                    continue
-                key = f"{section}:{_normalize_label_for_key(label)}"
-                cd_entry = cd_index.get(key)
-                if not cd_entry:
-                    norm_target = _normalize_label_for_key(label)
-                    best_key: Optional[str] = None
-                    best_score = 0
-                    for idx_key, idx_entry in cd_index.items():
-                        if not idx_key.startswith(f"{section}:"):
-                            continue
-                        score = fuzz.token_set_ratio(norm_target, idx_key.split(":", 1)[1])
-                        if score > best_score:
-                            best_score = score
-                            best_key = idx_key
-                    if best_key and best_score >= 80:
-                        cd_entry = cd_index.get(best_key)
-                if not cd_entry:
-                    continue
-                if cd_entry["seller"] > 0:
-                    reclass_dest = "seller"
-                elif cd_entry["other"] > 0:
-                    reclass_dest = "other"
-                else:
-                    continue
-
-                entry["reclassified_to"] = reclass_dest
-                entry["reclassified_amount"] = cd_entry[reclass_dest]
-                if cd_entry.get("label"):
-                    entry["cd_label"] = cd_entry["label"]
-
-        _mark_reclassified_off_borrower(matched_fee_dicts)
-
-        result_dict["matched_fees"] = matched_fee_dicts
-
-        tolerance_metrics = compute_tolerance_metrics(matched_fee_dicts)
-        result_dict["summary"]["tolerance_summary"] = tolerance_metrics["bucket_totals"]
-        result_dict["summary"]["ten_percent_test"] = tolerance_metrics["ten_percent_test"]
-        if tolerance_metrics["ten_percent_test"]["cure_required"] > 0:
-            result_dict["summary"]["lender_credit_recommendation"] = {
-                "recommended_credit": tolerance_metrics["ten_percent_test"]["cure_required"],
-                "note": "Apply lender credit to cure 10% tolerance excess.",
-            }
-
-        result_dict["diff_summary"] = build_fee_diff_summary(matched_fee_dicts)
 
-        return result_dict
+async def ai_match_fees(
+    le_record: dict,
+    cd_record: dict,
+    gemini_model: str = "gemini-2.5-pro",
+) -> dict:
+    """
+    Use AI to intelligently match and normalize fees between LE and CD
+    """
+    try:
+        # Most fees pair up by label alone; Gemini only sees what is left.
+        matched_fees, le_sections, cd_sections = _pair_fees_locally(
+            _le_prompt_sections(le_record), _cd_prompt_sections(cd_record)
+        )
+        if not any(le_sections.values()) and not any(cd_sections.values()):
+            result_dict = TRIDComparison().model_dump(exclude={"matched_fees"})
+        else:
+            result = await _llm_match_fees(le_sections, cd_sections, gemini_model)
+            # Matched fees are flat models, so skip the recursive model_dump() walk for them.
+            result_dict = result.model_dump(exclude={"matched_fees"})
+            if not isinstance(result_dict.get("summary"), dict):
+                result_dict["summary"] = {}
+            matched_fees.extend(result.matched_fees)
+        matched_fees.sort(key=lambda fee: FEE_SECTION_ORDER.get(fee.section, len(FEE_SECTIONS)))
+
+        # Tolerance classification, fuzzy CD lookups and the diff/metric reductions are
+        # pure CPU work; keep them off the event loop.
+        return await run_in_threadpool(
+            _finalize_fee_comparison, result_dict, matched_fees, cd_record
+        )
 
     except Exception as e:  # noqa: BLE001
         print(f"AI matching failed: {e}")
@@ -1362,21 +1707,18 @@ async def generate_financial_profile_summary(
 ) -> dict:
     """Generate comprehensive financial profile summary using AI"""
     try:
-        llm = ChatGoogleGenerativeAI(model=gemini_model, temperature=0.3)
-        structured_llm = llm.with_structured_output(
-            FinancialProfileSummary, method="function_calling"
-        )
+        structured_llm = get_structured_llm(gemini_model, 0.3, FinancialProfileSummary)
 
         prompt = f"""Analyze the following loan documents and TRID comparison to generate a comprehensive financial profile summary.
 
 LOAN ESTIMATE DATA:
-{json.dumps(le_data, indent=2) if le_data else "Not provided"}
+{compact_json(le_data) if le_data else "Not provided"}
 
 CLOSING DISCLOSURE DATA:
-{json.dumps(cd_data, indent=2) if cd_data else "Not provided"}
+{compact_json(cd_data) if cd_data else "Not provided"}
 
 TRID COMPARISON:
-{json.dumps(trid_comparison, indent=2) if trid_comparison else "Not provided"}
+{compact_json(trid_comparison) if trid_comparison else "Not provided"}
 
 Provide a comprehensive analysis covering:
 1. Borrower Overview: Who are the borrowers and what property are they purchasing?
@@ -1389,17 +1731,17 @@ Provide a comprehensive analysis covering:
 
 Be specific with numbers and provide actionable insights."""
 
-        result: FinancialProfileSummary = await run_in_threadpool(
-            structured_llm.invoke,
-            [
-                SystemMessage(
-                    content="You are an expert mortgage analyst providing comprehensive loan analysis."
-                ),
-                HumanMessage(content=prompt),
-            ],
-        )
+        async with GEMINI_SEMAPHORE:
+            result: FinancialProfileSummary = await structured_llm.ainvoke(
+                [
+                    SystemMessage(
+                        content="You are an expert mortgage analyst providing comprehensive loan analysis."
+                    ),
+                    HumanMessage(content=prompt),
+                ]
+            )
 
-        return result.dict()
+        return result.model_dump()
 
     except Exception as e:  # noqa: BLE001
         print(f"Financial profile summary generation failed: {e}")
@@ -1432,13 +1774,13 @@ Return ONLY the structured JSON object—no prose.
 """
 
 
+
+# Chains are stateless runnables, so one per (model, temperature) is reused across calls.
+@lru_cache(maxsize=8)
 def build_structured_chain(
     model_name: str = "gemini-2.5-pro", temperature: float = 0.0
 ):
-    llm = ChatGoogleGenerativeAI(model=model_name, temperature=temperature)
-    structured_llm = llm.with_structured_output(
-        LoanEstimateRecord, method="function_calling"
-    )
+    structured_llm = get_structured_llm(model_name, temperature, LoanEstimateRecord)
     chain = (
         {
             "sys": RunnableLambda(lambda x: SYSTEM),
@@ -1451,7 +1793,7 @@ def build_structured_chain(
                 HumanMessage(
                     content=(
                         "Extract the following Loan Estimate/Closing Disclosure markdown into the JSON schema.\n\n"
-                        f"### SOURCE_META\n{json.dumps(x['meta'])}\n\n"
+                        f"### SOURCE_META\n{compact_json(x['meta'])}\n\n"
                         f"### MARKDOWN\n{x['md']}\n"
                     )
                 ),
@@ -1462,6 +1804,7 @@ def build_structured_chain(
     return chain
 
 
+@lru_cache(maxsize=8)
 def build_fallback_json_chain(
     model_name: str = "gemini-2.5-pro", temperature: float = 0.0
 ):
@@ -1482,7 +1825,7 @@ def build_fallback_json_chain(
                 HumanMessage(
                     content=(
                         "Return ONLY valid JSON for the schema (no prose).\n\n"
-                        f"### SOURCE_META\n{json.dumps(x['meta'])}\n\n"
+                        f"### SOURCE_META\n{compact_json(x['meta'])}\n\n"
                         f"### MARKDOWN\n{x['md']}\n"
                     )
                 ),
@@ -1493,45 +1836,182 @@ def build_fallback_json_chain(
     return chain
 
 
-async def extract_json_from_markdown(
+def _extraction_cache_version() -> str:
+    # Changes whenever the prompt or output schema changes, invalidating cached records.
+    fingerprint = SYSTEM + json.dumps(LoanEstimateRecord.model_json_schema(), sort_keys=True)
+    return hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+
+
+EXTRACTION_CACHE_VERSION = _extraction_cache_version()
+
+
+async def _invoke_extraction(
     markdown_text: str,
     source_file: Optional[str],
     gemini_model: str,
 ) -> dict:
+    # The schema is almost entirely Optional; dropping the None fields shrinks the record
+    # (and every prompt, file and SSE frame it ends up in) severalfold.
     try:
         chain = build_structured_chain(model_name=gemini_model)
-        record: LoanEstimateRecord = await run_in_threadpool(
-            chain.invoke, {"markdown": markdown_text, "meta": {"source_file": source_file}}
-        )
-        data = record.dict()
-        data.setdefault("meta", {})
-        data["meta"]["source_file"] = source_file
-        return data
+        async with GEMINI_SEMAPHORE:
+            record: LoanEstimateRecord = await chain.ainvoke(
+                {"markdown": markdown_text, "meta": {"source_file": source_file}}
+            )
+        return record.model_dump(exclude_none=True)
     except ChatGoogleGenerativeAIError:
         chain = build_fallback_json_chain(model_name=gemini_model)
-        raw = await run_in_threadpool(
-            chain.invoke, {"markdown": markdown_text, "meta": {"source_file": source_file}}
-        )
+        async with GEMINI_SEMAPHORE:
+            raw = await chain.ainvoke(
+                {"markdown": markdown_text, "meta": {"source_file": source_file}}
+            )
         raw_text = getattr(raw, "content", str(raw))
         try:
-            obj = json.loads(raw_text)
-        except Exception as e:  # noqa: BLE001
-            raise HTTPException(status_code=500, detail=f"Gemini JSON parse failed: {e}") from e
-        try:
-            record = LoanEstimateRecord(**obj)
-            data = record.dict()
-            data.setdefault("meta", {})
-            data["meta"]["source_file"] = source_file
-            return data
-        except Exception as e:  # noqa: BLE001
-            raise HTTPException(status_code=500, detail=f"Pydantic validation failed: {e}") from e
+            # JSON text -> model in one pass, without an intermediate dict.
+            record = LoanEstimateRecord.model_validate_json(raw_text)
+        except ValidationError as e:
+            if any(error["type"] == "json_invalid" for error in e.errors()):
+                detail = f"Gemini JSON parse failed: {e}"
+            else:
+                detail = f"Pydantic validation failed: {e}"
+            raise HTTPException(status_code=500, detail=detail) from e
+        return record.model_dump(exclude_none=True)
+
+
+async def extract_json_from_markdown(
+    markdown_text: str,
+    source_file: Optional[str],
+    gemini_model: str,
+) -> dict:
+    # Identical markdown (e.g. a re-uploaded PDF) reuses the stored record instead of
+    # paying for another Gemini call.
+    markdown_hash = hashlib.sha256(markdown_text.encode("utf-8")).hexdigest()
+    cache_key = f"{markdown_hash}:{gemini_model}:{EXTRACTION_CACHE_VERSION}"
+    cached = await run_in_threadpool(llm_cache_get, cache_key)
+    if cached is not None:
+        data = orjson.loads(cached)
+    else:
+        data = await _invoke_extraction(markdown_text, source_file, gemini_model)
+        await run_in_threadpool(
+            llm_cache_put, cache_key, orjson.dumps(data).decode()
+        )
+
+    if not data.get("meta"):
+        data["meta"] = {}
+    data["meta"]["source_file"] = source_file
+    return data
 
 
 # LandingAI PDF → markdown
-def pdf_to_markdown(pdf_path: Path, landing_model: str = "dpt-2-latest") -> str:
-    client = LandingAIADE()
-    response = client.parse(document=pdf_path, model=landing_model)
-    return response.markdown
+
+# Caps in-flight LandingAI parses across all concurrent uploads/requests.
+LANDINGAI_SEMAPHORE = asyncio.Semaphore(int(os.getenv("LANDINGAI_MAX_CONCURRENCY", "16")))
+
+@lru_cache(maxsize=1)
+def get_landingai_client() -> AsyncLandingAIADE:
+    # Async (httpx) client: parses overlap on the event loop instead of each holding a
+    # worker thread for the whole round-trip.
+    return AsyncLandingAIADE()
+
+
+def pdf_content_hash(pdf_path: Path) -> str:
+    # file_digest hashes in C straight from the file, without loading the whole PDF.
+    with pdf_path.open("rb") as fh:
+        return hashlib.file_digest(fh, lambda: hashlib.blake2b(digest_size=16)).hexdigest()
+
+
+def extract_text_layer_markdown(pdf_path: Path) -> str:
+    """Build markdown from the PDF's embedded text layer (no OCR / vision)."""
+    with pdfplumber.open(str(pdf_path)) as pdf:
+        page_texts = [(page.extract_text() or "").strip() for page in pdf.pages]
+    return "\n\n".join(
+        f"## Page {number}\n\n{text}" for number, text in enumerate(page_texts, 1) if text
+    )
+
+
+def _split_pages(reader: PdfReader) -> List[Tuple[str, bytes, str]]:
+    """Each page as its own single-page PDF upload, kept in memory."""
+    uploads: List[Tuple[str, bytes, str]] = []
+    for number, page in enumerate(reader.pages, 1):
+        writer = PdfWriter()
+        writer.add_page(page)
+        buffer = io.BytesIO()
+        writer.write(buffer)
+        uploads.append((f"page-{number:04d}.pdf", buffer.getvalue(), "application/pdf"))
+    return uploads
+
+
+def _prepare_markdown(
+    pdf_path: Path, landing_model: str
+) -> Tuple[Optional[str], Optional[Path], Optional[List[Tuple[str, bytes, str]]]]:
+    """
+    Local (blocking) half of pdf_to_markdown. Returns the markdown if it is already known
+    (text layer or cache hit); otherwise the cache path to fill and, when the document is
+    split, the per-page uploads.
+    """
+    # Tier 1 (opt-in): text-based PDFs can skip the vision parse entirely when the
+    # local text layer has enough content. Disabled when the threshold is 0.
+    min_chars = int(os.getenv("PDF_TEXT_LAYER_MIN_CHARS", "0"))
+    if min_chars > 0:
+        text_markdown = extract_text_layer_markdown(pdf_path)
+        if len(text_markdown) >= min_chars:
+            print(f"pdf_to_markdown: text layer used for {pdf_path.name}")
+            return text_markdown, None, None
+        print(f"pdf_to_markdown: text layer too short for {pdf_path.name}, using LandingAI")
+
+    # Opt-in page-level split: documents with at least LANDINGAI_PAGE_SPLIT_MIN_PAGES
+    # pages are parsed page by page so one long file does not become the straggler.
+    # Disabled when the threshold is 0; split results are cached under their own key.
+    split_reader: Optional[PdfReader] = None
+    min_pages = int(os.getenv("LANDINGAI_PAGE_SPLIT_MIN_PAGES", "0"))
+    if min_pages > 0:
+        reader = PdfReader(str(pdf_path))
+        if len(reader.pages) >= min_pages:
+            split_reader = reader
+
+    # Tier 2: parsed markdown is cached on disk by PDF content hash so re-uploading an
+    # unchanged document skips the LandingAI round-trip.
+    cache_dir = ensure_cache_dir() / "landingai"
+    cache_dir.mkdir(exist_ok=True)
+    mode = "-pages" if split_reader is not None else ""
+    cache_name = f"{pdf_content_hash(pdf_path)}-{SAFE_CHARS.sub('_', landing_model)}{mode}.md"
+    cache_path = cache_dir / cache_name
+    if cache_path.exists():
+        return cache_path.read_text(encoding="utf-8"), None, None
+
+    pages = _split_pages(split_reader) if split_reader is not None else None
+    return None, cache_path, pages
+
+
+def _write_markdown_cache(cache_path: Path, markdown: str) -> None:
+    tmp_path = cache_path.with_suffix(".md.tmp")
+    tmp_path.write_text(markdown, encoding="utf-8")
+    tmp_path.replace(cache_path)
+
+
+async def pdf_to_markdown(pdf_path: Path, landing_model: str = "dpt-2-latest") -> str:
+    markdown, cache_path, pages = await run_in_threadpool(
+        _prepare_markdown, pdf_path, landing_model
+    )
+    if markdown is not None:
+        return markdown
+
+    client = get_landingai_client()
+    if pages is not None:
+        # Pages of one document are parsed concurrently, LANDINGAI_PAGE_WORKERS at a time.
+        page_slots = asyncio.Semaphore(max(1, int(os.getenv("LANDINGAI_PAGE_WORKERS", "4"))))
+
+        async def parse_page(page: Tuple[str, bytes, str]) -> str:
+            async with page_slots:
+                return (await client.parse(document=page, model=landing_model)).markdown
+
+        parts = await asyncio.gather(*(parse_page(page) for page in pages))
+        markdown = "\n\n".join(parts)
+    else:
+        markdown = (await client.parse(document=pdf_path, model=landing_model)).markdown
+
+    await run_in_threadpool(_write_markdown_cache, cache_path, markdown)
+    return markdown
 
 
 # ──────────────────────────────────────────────────────────────────────────────
@@ -1543,16 +2023,115 @@ def ensure_storage_dir() -> Path:
     return storage
 
 
+def ensure_cache_dir() -> Path:
+    cache = Path(os.getenv("CACHE_DIR") or ensure_storage_dir() / "cache").resolve()
+    cache.mkdir(parents=True, exist_ok=True)
+    return cache
+
+
+@lru_cache(maxsize=1)
+def _llm_cache_path() -> Path:
+    # The table is created once per process; later connections only SELECT/INSERT.
+    path = ensure_cache_dir() / "llm_cache.sqlite3"
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+    return path
+
+
+def _llm_cache_connect() -> sqlite3.Connection:
+    return sqlite3.connect(_llm_cache_path())
+
+
+def llm_cache_get(key: str) -> Optional[str]:
+    with closing(_llm_cache_connect()) as conn:
+        row = conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else None
+
+
+def llm_cache_put(key: str, value: str) -> None:
+    with closing(_llm_cache_connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, value) VALUES (?, ?)", (key, value)
+        )
+
+
 SAFE_CHARS = re.compile(r"[^A-Za-z0-9._-]+")
 
 
-def safe_stem(filename: str) -> str:
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+
+def save_upload(source: BinaryIO, dest: Path) -> int:
+    """Stream an uploaded file object to `dest`; returns the number of bytes written."""
+    with dest.open("wb") as out:
+        shutil.copyfileobj(source, out, UPLOAD_CHUNK_SIZE)
+        return out.tell()
+
+
+def write_outputs(
+    json_path: Path,
+    record: Dict[str, Any],
+    md_path: Optional[Path] = None,
+    markdown_text: str = "",
+) -> None:
+    """Write the extracted record (and optionally its markdown) in one threadpool hop."""
+    json_path.write_bytes(orjson.dumps(record, option=ORJSON_OPTIONS | orjson.OPT_INDENT_2))
+    if md_path is not None:
+        md_path.write_text(markdown_text, encoding="utf-8")
+
+
+@lru_cache(maxsize=512)
+def _sanitize_stem(filename: str) -> str:
     stem = Path(filename).stem
     stem = SAFE_CHARS.sub("_", stem).strip("_")
-    if not stem:
-        stem = "document"
-    ts = datetime.now().strftime("%Y%m%d-%H%M%S")
-    return f"{stem}-{ts}"
+    return stem or "document"
+
+
+FILE_SEQUENCE = count()
+
+
+@lru_cache(maxsize=2)
+def _second_timestamp(second: int) -> str:
+    return datetime.fromtimestamp(second).strftime("%Y%m%d-%H%M%S")
+
+
+def file_timestamp() -> str:
+    # strftime runs once per second; the sequence number keeps same-second names unique.
+    return f"{_second_timestamp(int(time.time()))}-{next(FILE_SEQUENCE)}"
+
+
+def safe_stem(filename: str) -> str:
+    # Only the sanitized name is cached; the timestamp must stay per call.
+    return f"{_sanitize_stem(filename)}-{file_timestamp()}"
+
+
+RESULT_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def result_path(result_id: str, cacheable: bool) -> Path:
+    # Results with errors get their own suffix so /api/result can tell them apart
+    # without reading the file.
+    suffix = ".json" if cacheable else ".errors.json"
+    return ensure_storage_dir() / "results" / f"{result_id}{suffix}"
+
+
+def save_result(payload: Dict[str, Any]) -> str:
+    """Persist a finished pipeline payload for /api/result; returns its id."""
+    result_id = uuid.uuid4().hex
+    path = result_path(result_id, cacheable=payload.get("errors") is None)
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(orjson.dumps(payload, option=ORJSON_OPTIONS))
+    return result_id
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in tags or etag in tags
 
 
 async def process_file(
@@ -1564,39 +2143,30 @@ async def process_file(
     storage = ensure_storage_dir()
     base = safe_stem(file.filename)
 
-    pdf_bytes = await file.read()
-    if not pdf_bytes:
-        raise HTTPException(status_code=400, detail=f"Empty file: {file.filename}")
-
+    # Copy the upload to storage in 1 MiB chunks off the event loop instead of holding
+    # the whole PDF in memory.
     pdf_storage_path = storage / f"{base}.pdf"
-    pdf_storage_path.write_bytes(pdf_bytes)
-
-    with tempfile.TemporaryDirectory() as tmpdir:
-        pdf_path = Path(tmpdir) / file.filename
-        pdf_path.write_bytes(pdf_bytes)
+    await file.seek(0)
+    size = await run_in_threadpool(save_upload, file.file, pdf_storage_path)
+    if not size:
+        pdf_storage_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=400, detail=f"Empty file: {file.filename}")
 
-        # 1) PDF -> Markdown
-        markdown_text = await run_in_threadpool(
-            pdf_to_markdown, pdf_path, landing_model
-        )
+    # 1) PDF -> Markdown, straight from the stored copy (no second temp-file write)
+    async with LANDINGAI_SEMAPHORE:
+        markdown_text = await pdf_to_markdown(pdf_storage_path, landing_model)
 
-        # 2) Markdown -> JSON
-        record = await extract_json_from_markdown(
-            markdown_text=markdown_text,
-            source_file=file.filename,
-            gemini_model=gemini_model,
-        )
-
-    # 3) Persist outputs
-    json_path = storage / f"{base}.json"
-    json_path.write_text(
-        json.dumps(record, ensure_ascii=False, indent=2), encoding="utf-8"
+    # 2) Markdown -> JSON
+    record = await extract_json_from_markdown(
+        markdown_text=markdown_text,
+        source_file=file.filename,
+        gemini_model=gemini_model,
     )
 
-    md_path = None
-    if save_markdown:
-        md_path = storage / f"{base}.md"
-        md_path.write_text(markdown_text, encoding="utf-8")
+    # 3) Persist outputs off the event loop so other in-flight streams keep moving
+    json_path = storage / f"{base}.json"
+    md_path = storage / f"{base}.md" if save_markdown else None
+    await run_in_threadpool(write_outputs, json_path, record, md_path, markdown_text)
 
     return {
         "source_file": file.filename,
@@ -1610,7 +2180,51 @@ async def process_file(
 # ──────────────────────────────────────────────────────────────────────────────
 # 6) FastAPI app
 
-app = FastAPI(title="Fintrid TRID Analyzer API", version="1.0.0")
+class ORJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson; much faster for the large nested payloads."""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
+
+
+async def stream_comparison_json(payload: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """
+    Yield `payload` as one JSON document, emitting trid_comparison.matched_fees
+    fee by fee so the first bytes go out before the whole blob is serialized.
+    """
+    dumps = orjson.dumps
+    comparison = payload.get("trid_comparison")
+    head = {k: v for k, v in payload.items() if k != "trid_comparison"}
+    prelude = dumps(head, option=ORJSON_OPTIONS)[:-1]
+    yield prelude + (b',"trid_comparison":' if head else b'"trid_comparison":')
+
+    if not isinstance(comparison, dict) or not isinstance(comparison.get("matched_fees"), list):
+        yield dumps(comparison, option=ORJSON_OPTIONS) + b"}"
+        return
+
+    rest = {k: v for k, v in comparison.items() if k != "matched_fees"}
+    prelude = dumps(rest, option=ORJSON_OPTIONS)[:-1]
+    yield prelude + (b',"matched_fees":[' if rest else b'"matched_fees":[')
+    for i, fee in enumerate(comparison["matched_fees"]):
+        yield (b"," if i else b"") + dumps(fee, option=ORJSON_OPTIONS)
+    yield b"]}}"
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI) -> AsyncIterator[None]:
+    await run_in_threadpool(warm_pdf_page_pool)
+    yield
+    shutdown_pdf_page_pool()
+
+
+app = FastAPI(
+    title="Fintrid TRID Analyzer API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # CORS for your Next.js frontend (adjust origins as needed)
 app.add_middleware(
@@ -1632,6 +2246,39 @@ async def root():
     }
 
 
+def _plain_sse_frame(step: str, message: str) -> bytes:
+    body = b'{"step":' + orjson.dumps(step) + b',"message":' + orjson.dumps(message) + b"}"
+    return b"data: " + body + b"\n\n"
+
+
+# Progress frames whose text never changes are encoded once at import; frames carrying
+# file names, counts or error text are encoded per call.
+STATIC_SSE_FRAMES: Dict[Tuple[str, str], bytes] = {
+    key: _plain_sse_frame(*key)
+    for key in (
+        ("start", "Starting document processing"),
+        ("pdf_to_md", "Converting PDFs to Markdown (parallel)"),
+        ("detecting", "Detecting document types"),
+        ("ai_matching", "AI matching borrower-paid fees"),
+        ("summary_generation", "Generating comprehensive financial profile summary"),
+        ("pdf_highlight", "Annotating PDFs with diff highlights"),
+        ("summary_complete", "Financial profile summary generated"),
+        ("pdf_highlight_complete", "PDF highlights generated"),
+        ("pdf_highlight", "No diff highlights needed"),
+        ("report_generation", "Generating TRID curated PDF report"),
+    )
+}
+
+
+def _sse(step: str, message: str, **extra: Any) -> bytes:
+    """One server-sent event frame, serialized with orjson."""
+    if not extra:
+        frame = STATIC_SSE_FRAMES.get((step, message))
+        return frame if frame is not None else _plain_sse_frame(step, message)
+    event = {"step": step, "message": message, **extra}
+    return b"data: " + orjson.dumps(event, option=ORJSON_OPTIONS) + b"\n\n"
+
+
 async def progress_generator(
     files: List[UploadFile],
     landing_model: str,
@@ -1639,15 +2286,14 @@ async def progress_generator(
     save_markdown: bool,
     run_ai_matching: bool,
     generate_summary: bool,
-) -> AsyncIterator[str]:
+    inline_payload: bool = True,
+) -> AsyncIterator[bytes]:
     try:
-        yield f"data: {json.dumps({'step': 'start', 'message': 'Starting document processing'})}\n\n"
+        yield _sse("start", "Starting document processing")
 
-        yield f"data: {json.dumps({'step': 'upload', 'message': f'Received {len(files)} document(s)'})}\n\n"
+        yield _sse("upload", f"Received {len(files)} document(s)")
 
-        yield (
-            f"data: {json.dumps({'step': 'pdf_to_md', 'message': 'Converting PDFs to Markdown (parallel)'})}\n\n"
-        )
+        yield _sse("pdf_to_md", "Converting PDFs to Markdown (parallel)")
 
         results = await asyncio.gather(
             *(process_file(f, landing_model, gemini_model, save_markdown) for f in files),
@@ -1664,12 +2310,12 @@ async def progress_generator(
                 outputs.append(res)
 
         if errors and not outputs:
-            yield f"data: {json.dumps({'step': 'error', 'message': '; '.join(errors)})}\n\n"
+            yield _sse("error", "; ".join(errors))
             return
 
-        yield f"data: {json.dumps({'step': 'extraction_complete', 'message': f'Extracted {len(outputs)} document(s)'})}\n\n"
+        yield _sse("extraction_complete", f"Extracted {len(outputs)} document(s)")
 
-        yield f"data: {json.dumps({'step': 'detecting', 'message': 'Detecting document types'})}\n\n"
+        yield _sse("detecting", "Detecting document types")
 
         le_data: Optional[dict] = None
         cd_data: Optional[dict] = None
@@ -1684,19 +2330,19 @@ async def progress_generator(
                 le_data = output["json_data"]
                 le_pdf_path = output.get("pdf_path")
                 source_file = output["source_file"]
-                yield f"data: {json.dumps({'step': 'detection', 'message': f'Detected Loan Estimate: {source_file}'})}\n\n"
+                yield _sse("detection", f"Detected Loan Estimate: {source_file}")
             elif doc_type == "closing_disclosure":
                 cd_data = output["json_data"]
                 cd_pdf_path = output.get("pdf_path")
                 source_file = output["source_file"]
-                yield f"data: {json.dumps({'step': 'detection', 'message': f'Detected Closing Disclosure: {source_file}'})}\n\n"
+                yield _sse("detection", f"Detected Closing Disclosure: {source_file}")
             else:
                 source_file = output["source_file"]
-                yield f"data: {json.dumps({'step': 'detection', 'message': f'Unknown document type: {source_file}'})}\n\n"
+                yield _sse("detection", f"Unknown document type: {source_file}")
 
         trid_comparison: Optional[dict] = None
         if run_ai_matching and le_data and cd_data:
-            yield f"data: {json.dumps({'step': 'ai_matching', 'message': 'AI matching borrower-paid fees'})}\n\n"
+            yield _sse("ai_matching", "AI matching borrower-paid fees")
 
             try:
                 trid_comparison = await ai_match_fees(
@@ -1704,52 +2350,74 @@ async def progress_generator(
                 )
 
                 fee_count = len(trid_comparison.get("matched_fees", []))
-                yield f"data: {json.dumps({'step': 'ai_complete', 'message': f'Matched {fee_count} borrower-paid fees'})}\n\n"
+                yield _sse("ai_complete", f"Matched {fee_count} borrower-paid fees")
             except Exception as match_error:  # noqa: BLE001
                 errors.append(f"AI matching failed: {str(match_error)}")
-                yield f"data: {json.dumps({'step': 'ai_error', 'message': str(match_error)})}\n\n"
+                yield _sse("ai_error", str(match_error))
 
+        # Summary generation (Gemini) and PDF highlighting (page pool + threadpool) only
+        # depend on trid_comparison, so they run side by side and report as each finishes.
         financial_summary: Optional[dict] = None
+        pdf_highlights: Optional[dict] = None
+        stages: Dict[asyncio.Task, str] = {}
         if generate_summary and (le_data or cd_data):
-            yield f"data: {json.dumps({'step': 'summary_generation', 'message': 'Generating comprehensive financial profile summary'})}\n\n"
-
-            try:
-                financial_summary = await generate_financial_profile_summary(
-                    le_data, cd_data, trid_comparison, gemini_model
-                )
-                yield f"data: {json.dumps({'step': 'summary_complete', 'message': 'Financial profile summary generated'})}\n\n"
-            except Exception as summary_error:  # noqa: BLE001
-                errors.append(f"Summary generation failed: {str(summary_error)}")
-                yield f"data: {json.dumps({'step': 'summary_error', 'message': str(summary_error)})}\n\n"
+            yield _sse("summary_generation", "Generating comprehensive financial profile summary")
+            summary_task = asyncio.create_task(
+                generate_financial_profile_summary(le_data, cd_data, trid_comparison, gemini_model)
+            )
+            stages[summary_task] = "summary"
 
         if trid_comparison and (le_pdf_path or cd_pdf_path):
-            yield f"data: {json.dumps({'step': 'pdf_highlight', 'message': 'Annotating PDFs with diff highlights'})}\n\n"
-            try:
-                pdf_highlights = await run_in_threadpool(
-                    generate_pdf_highlights,
+            yield _sse("pdf_highlight", "Annotating PDFs with diff highlights")
+            highlight_task = asyncio.create_task(
+                generate_pdf_highlights(
                     le_pdf_path,
                     cd_pdf_path,
                     trid_comparison.get("diff_summary"),
                 )
-                if pdf_highlights:
-                    trid_comparison["pdf_highlights"] = pdf_highlights
-                    yield f"data: {json.dumps({'step': 'pdf_highlight_complete', 'message': 'PDF highlights generated'})}\n\n"
-                else:
-                    yield f"data: {json.dumps({'step': 'pdf_highlight', 'message': 'No diff highlights needed'})}\n\n"
-            except Exception as highlight_error:  # noqa: BLE001
-                errors.append(f"PDF highlighting failed: {str(highlight_error)}")
-                yield f"data: {json.dumps({'step': 'pdf_highlight_error', 'message': str(highlight_error)})}\n\n"
+            )
+            stages[highlight_task] = "highlight"
+
+        pending = set(stages)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    stage_error = task.exception()
+                    if stages[task] == "summary":
+                        if stage_error is not None:
+                            errors.append(f"Summary generation failed: {str(stage_error)}")
+                            yield _sse("summary_error", str(stage_error))
+                        else:
+                            financial_summary = task.result()
+                            yield _sse("summary_complete", "Financial profile summary generated")
+                    elif stage_error is not None:
+                        errors.append(f"PDF highlighting failed: {str(stage_error)}")
+                        yield _sse("pdf_highlight_error", str(stage_error))
+                    else:
+                        pdf_highlights = task.result()
+                        if pdf_highlights:
+                            yield _sse("pdf_highlight_complete", "PDF highlights generated")
+                        else:
+                            yield _sse("pdf_highlight", "No diff highlights needed")
+        finally:
+            # Client went away mid-stream: don't leave Gemini/PDF work running.
+            for task in pending:
+                task.cancel()
+
+        # Attached only once both stages are done so the summary prompt never races it.
+        if pdf_highlights:
+            trid_comparison["pdf_highlights"] = pdf_highlights
 
         pdf_report_path: Optional[str] = None
         if trid_comparison and (le_data or cd_data):
             try:
-                yield f"data: {json.dumps({'step': 'report_generation', 'message': 'Generating TRID curated PDF report'})}\n\n"
+                yield _sse("report_generation", "Generating TRID curated PDF report")
 
                 loan_meta = extract_loan_meta_from_responses(le_data, cd_data)
 
                 storage_dir = ensure_storage_dir()
-                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-                pdf_filename = f"trid_report_{timestamp}.pdf"
+                pdf_filename = f"trid_report_{file_timestamp()}.pdf"
                 pdf_report_path = str(storage_dir / pdf_filename)
 
                 await run_in_threadpool(
@@ -1759,10 +2427,10 @@ async def progress_generator(
                     pdf_report_path,
                 )
 
-                yield f"data: {json.dumps({'step': 'report_complete', 'message': f'PDF report generated: {pdf_filename}'})}\n\n"
+                yield _sse("report_complete", f"PDF report generated: {pdf_filename}")
             except Exception as report_error:  # noqa: BLE001
                 errors.append(f"Report generation failed: {str(report_error)}")
-                yield f"data: {json.dumps({'step': 'report_error', 'message': str(report_error)})}\n\n"
+                yield _sse("report_error", str(report_error))
 
         payload = {
             "meta": {
@@ -1781,10 +2449,17 @@ async def progress_generator(
             "errors": errors or None,
         }
 
-        yield f"data: {json.dumps({'step': 'complete', 'message': 'Processing complete', 'payload': payload})}\n\n"
+        if inline_payload:
+            yield _sse("complete", "Processing complete", payload=payload)
+        else:
+            # Keep the SSE frame small; the client fetches the payload once over plain HTTP.
+            result_id = await run_in_threadpool(save_result, payload)
+            yield _sse(
+                "complete", "Processing complete", payload_url=f"/api/result/{result_id}"
+            )
 
     except Exception as e:  # noqa: BLE001
-        yield f"data: {json.dumps({'step': 'error', 'message': str(e)})}\n\n"
+        yield _sse("error", str(e))
 
 
 @app.post("/api/extract/stream")
@@ -1802,6 +2477,11 @@ async def extract_stream_endpoint(
     generate_summary: bool = Query(
         True, description="Generate comprehensive financial profile summary"
     ),
+    inline_payload: bool = Query(
+        True,
+        description="Embed the final payload in the 'complete' event; if false, send "
+        "a payload_url to fetch it from instead",
+    ),
 ):
     if len(files) == 0:
         raise HTTPException(
@@ -1816,17 +2496,39 @@ async def extract_stream_endpoint(
             save_markdown,
             run_ai_matching,
             generate_summary,
+            inline_payload,
         ),
         media_type="text/event-stream",
         headers={
-            "Cache-Control": "no-cache",
+            "Cache-Control": "no-cache, no-store",
             "Connection": "keep-alive",
             "X-Accel-Buffering": "no",
         },
     )
 
 
-@app.post("/api/extract/pair", response_class=JSONResponse)
+@app.get("/api/result/{result_id}")
+async def get_result_endpoint(request: Request, result_id: str):
+    if not RESULT_ID.fullmatch(result_id):
+        raise HTTPException(status_code=404, detail="Result not found")
+    # A saved result never changes, so its id is a strong validator; failed runs are
+    # not worth revalidating and are never cached.
+    path = result_path(result_id, cacheable=True)
+    if path.exists():
+        etag = f'"{result_id}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+    else:
+        path = result_path(result_id, cacheable=False)
+        if not path.exists():
+            raise HTTPException(status_code=404, detail="Result not found")
+        headers = {"Cache-Control": "no-store"}
+    body = await run_in_threadpool(path.read_bytes)
+    return Response(body, media_type="application/json", headers=headers)
+
+
+@app.post("/api/extract/pair")
 async def extract_pair_endpoint(
     files: List[UploadFile] = File(..., description="Exactly two PDF files"),
     save_markdown: bool = Query(
@@ -1894,7 +2596,9 @@ async def extract_pair_endpoint(
             "trid_comparison": trid_comparison,
             "errors": errors or None,
         }
-        return JSONResponse(payload)
+        return StreamingResponse(
+            stream_comparison_json(payload), media_type="application/json"
+        )
 
     except HTTPException:
         raise
@@ -1902,7 +2606,7 @@ async def extract_pair_endpoint(
         raise HTTPException(status_code=500, detail=str(e)) from e
 
 
-@app.post("/api/extract", response_class=JSONResponse)
+@app.post("/api/extract", response_class=ORJSONResponse)
 async def extract_single_endpoint(
     file: UploadFile = File(..., description="Single PDF file"),
     save_markdown: bool = Query(True),
@@ -1923,7 +2627,7 @@ async def extract_single_endpoint(
             if include_paths
             else {"source_file": result["source_file"]},
         }
-        return JSONResponse(payload)
+        return ORJSONResponse(payload)
     except HTTPException:
         raise
     except Exception as e:  # noqa: BLE001
@@ -0,0 +1,151 @@
+"""
+PDF page layout extraction: words, clustered lines and section ranges per page.
+
+Kept free of the API's imports so process-pool workers only load pdfplumber and NumPy.
+"""
+
+from __future__ import annotations
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pdfplumber
+
+SECTION_HEADER_PATTERN = re.compile(r"^([A-H])\.\s", re.IGNORECASE)
+SECTION_HEADER_LETTERS = frozenset("ABCDEFGHabcdefgh")
+NON_ALNUM_PATTERN = re.compile(r"[^a-z0-9]+")
+NON_DIGIT_PATTERN = re.compile(r"[^0-9]")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=4096)
+def _normalize_text(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    return NON_ALNUM_PATTERN.sub("", value.lower())
+
+
+@lru_cache(maxsize=4096)
+def _normalize_for_fuzz(value: Optional[str]) -> str:
+    if not value:
+        return ""
+    text = value.lower()
+    text = WHITESPACE_PATTERN.sub(" ", text)
+    return text.strip()
+
+
+@lru_cache(maxsize=4096)
+def _tokenize_text(value: Optional[str]) -> Tuple[str, ...]:
+    # Returns a tuple: the result is cached and shared between callers.
+    if not value:
+        return ()
+    return tuple(TOKEN_PATTERN.findall(value.lower()))
+
+
+def _cluster_words_into_lines(words: List[dict], y_tol: float = 3.0) -> List[Dict[str, Any]]:
+    if not words:
+        return []
+
+    count = len(words)
+    tops = np.fromiter((w["top"] for w in words), dtype=float, count=count)
+    bottoms = np.fromiter((w["bottom"] for w in words), dtype=float, count=count)
+    x0s = np.fromiter((w["x0"] for w in words), dtype=float, count=count)
+    x1s = np.fromiter((w["x1"] for w in words), dtype=float, count=count)
+
+    # Stable sort by (top, x0); lexsort treats the last key as primary.
+    order = np.lexsort((x0s, tops))
+    ordered = [words[i] for i in order.tolist()]
+    tops, bottoms, x0s, x1s = tops[order], bottoms[order], x0s[order], x1s[order]
+
+    # Words are sorted by top, so each line's top is the top of its first word and a
+    # new line starts as soon as a word sits more than y_tol below it: one linear scan
+    # instead of searching every existing line per word.
+    starts = [0]
+    line_top = tops[0]
+    for idx in range(1, len(tops)):
+        if tops[idx] - line_top > y_tol:
+            starts.append(idx)
+            line_top = tops[idx]
+    bounds = np.array(starts)
+    ends = starts[1:] + [len(ordered)]
+
+    lines: List[Dict[str, Any]] = [
+        {
+            "top": top,
+            "bottom": bottom,
+            "x0": x0,
+            "x1": x1,
+            "words": ordered[start:end],
+        }
+        for start, end, top, bottom, x0, x1 in zip(
+            starts,
+            ends,
+            np.minimum.reduceat(tops, bounds).tolist(),
+            np.maximum.reduceat(bottoms, bounds).tolist(),
+            np.minimum.reduceat(x0s, bounds).tolist(),
+            np.maximum.reduceat(x1s, bounds).tolist(),
+        )
+    ]
+
+    for line in lines:
+        ordered_words = sorted(line["words"], key=lambda w: w["x0"])
+        text = " ".join(w["text"] for w in ordered_words).strip()
+        line["text"] = text
+        line["norm_text"] = _normalize_text(text)
+        line["digits"] = NON_DIGIT_PATTERN.sub("", text)
+        line["fuzzy_text"] = _normalize_for_fuzz(text)
+        line["tokens"] = _tokenize_text(text)
+        line["mid_y"] = (line["top"] + line["bottom"]) / 2
+    return lines
+
+
+WORD_KEYS = ("text", "x0", "x1", "top", "bottom")
+
+
+def _extract_page_layout(page: Any, index: int) -> Dict[str, Any]:
+    # One walk over page.chars; only text + bbox are kept per word so the line dicts
+    # stay small when they are pickled back from the page pool.
+    words = [
+        {key: word[key] for key in WORD_KEYS}
+        for word in page.extract_words(
+            x_tolerance=1.5,
+            y_tolerance=0.5,
+            keep_blank_chars=False,
+            use_text_flow=True,
+            extra_attrs=[],
+        )
+    ]
+    lines = _cluster_words_into_lines(words)
+    # Single pass: each section header closes the previous section's range. The cheap
+    # "X." prefix check keeps most lines away from the regex engine.
+    section_ranges: Dict[str, Tuple[float, float]] = {}
+    current_section: Optional[str] = None
+    current_top = 0.0
+    for line in lines:
+        text = line["text"]
+        if len(text) < 3 or text[1] != "." or text[0] not in SECTION_HEADER_LETTERS:
+            continue
+        match = SECTION_HEADER_PATTERN.match(text)
+        if match:
+            if current_section is not None:
+                section_ranges[current_section] = (current_top, line["top"])
+            current_section = match.group(1).upper()
+            current_top = line["top"]
+    if current_section is not None:
+        section_ranges[current_section] = (current_top, page.height)
+    return {
+        "index": index,
+        "width": page.width,
+        "height": page.height,
+        "lines": lines,
+        "section_ranges": section_ranges,
+    }
+
+
+def _extract_pdf_page_range(pdf_path: str, indices: range) -> List[Dict[str, Any]]:
+    # Process-pool worker: each worker opens the PDF itself and handles a run of pages.
+    with pdfplumber.open(pdf_path) as pdf:
+        return [_extract_page_layout(pdf.pages[index], index) for index in indices]
@@ -0,0 +1,83 @@
+"""Local LE/CD fee pairing must leave ambiguous labels to the LLM."""
+
+from fintrid_backend.main import _pair_fees_locally
+
+
+def _pair(section, le_items, cd_items):
+    key = f"section_{section}"
+    matched, le_left, cd_left = _pair_fees_locally({key: le_items}, {key: cd_items})
+    return matched, le_left[key], cd_left[key]
+
+
+def _labels(items):
+    return sorted(item["label"] for item in items)
+
+
+def test_exact_unique_labels_pair():
+    matched, le_left, cd_left = _pair(
+        "B",
+        [{"label": "01 Appraisal Fee to Acme", "amount": 650.0}],
+        [{"label": "03 Appraisal Fee to Acme", "amount": 675.0}],
+    )
+    assert [(m.le_amount, m.cd_amount, m.match_confidence) for m in matched] == [
+        (650.0, 675.0, 1.0)
+    ]
+    assert le_left == [] and cd_left == []
+
+
+def test_label_inside_several_cd_labels_goes_to_llm():
+    matched, le_left, cd_left = _pair(
+        "E",
+        [{"label": "01 Recording Fees", "amount": 200.0}],
+        [
+            {"label": "01 Recording Fees - Deed", "amount": 50.0},
+            {"label": "02 Recording Fees - Mortgage", "amount": 160.0},
+        ],
+    )
+    assert matched == []
+    assert _labels(le_left) == ["01 Recording Fees"]
+    assert _labels(cd_left) == ["01 Recording Fees - Deed", "02 Recording Fees - Mortgage"]
+
+
+def test_subset_label_is_not_a_fuzzy_match():
+    matched, le_left, cd_left = _pair(
+        "B",
+        [{"label": "01 Appraisal Fee", "amount": 650.0}],
+        [{"label": "02 Appraisal Re-inspection Fee", "amount": 150.0}],
+    )
+    assert matched == []
+    assert _labels(le_left) == ["01 Appraisal Fee"]
+    assert _labels(cd_left) == ["02 Appraisal Re-inspection Fee"]
+
+
+def test_title_insurance_is_not_paired_with_endorsement():
+    matched, le_left, cd_left = _pair(
+        "C",
+        [{"label": "01 Title - Lender's Title Insurance", "amount": 900.0}],
+        [{"label": "04 Title - Lender's Title Insurance Endorsement", "amount": 75.0}],
+    )
+    assert matched == []
+    assert len(le_left) == 1 and len(cd_left) == 1
+
+
+def test_close_spelling_variants_still_pair():
+    matched, le_left, cd_left = _pair(
+        "C",
+        [{"label": "02 Title - Settlement Agent Fee", "amount": 500.0}],
+        [{"label": "02 Title – Settlement Agent Fees", "amount": 525.0}],
+    )
+    assert [(m.le_amount, m.cd_amount) for m in matched] == [(500.0, 525.0)]
+    assert le_left == [] and cd_left == []
+
+
+def test_repeated_labels_go_to_llm():
+    matched, le_left, cd_left = _pair(
+        "C",
+        [
+            {"label": "Pest Inspection", "amount": 100.0},
+            {"label": "Pest Inspection", "amount": 50.0},
+        ],
+        [{"label": "Pest Inspection", "amount": 120.0}],
+    )
+    assert matched == []
+    assert len(le_left) == 2 and len(cd_left) == 1
@@ -0,0 +1,82 @@
+"""compute_fee_statuses must classify fees exactly like the per-fee reference below."""
+
+from itertools import product
+from typing import Any, Dict, Optional
+
+import pytest
+
+from fintrid_backend.generate_trid_curated_report import compute_fee_statuses
+
+
+def compute_status_and_diff(
+    le_amount: Optional[float],
+    cd_amount: Optional[float],
+    tolerance: str,
+) -> Dict[str, Any]:
+    """
+    Basic tolerance logic:
+    - zero: cd must not exceed le (if both present)
+    - ten_percent: cd <= le * 1.10
+    - unlimited: always "OK" for tolerance purposes
+    Also classify missing/added fees.
+    """
+    if le_amount is None and cd_amount is None:
+        return {"status": "N/A", "difference": None, "violates": False}
+
+    if le_amount is None and cd_amount is not None:
+        return {"status": "Added on CD", "difference": cd_amount, "violates": True}
+
+    if le_amount is not None and cd_amount is None:
+        return {"status": "Missing on CD", "difference": -le_amount, "violates": True}
+
+    diff = (cd_amount or 0.0) - (le_amount or 0.0)
+
+    if tolerance == "unlimited":
+        status = "Within tolerance (unlimited)"
+        violates = False
+    elif tolerance == "zero":
+        if diff > 0:
+            status = "Exceeded ZERO tolerance"
+            violates = True
+        else:
+            status = "Within ZERO tolerance"
+            violates = False
+    elif tolerance == "ten_percent":
+        if le_amount is None or le_amount == 0:
+            status = "Check manually"
+            violates = False
+        else:
+            allowed = le_amount * 0.10
+            if diff > allowed:
+                status = "Exceeded 10% tolerance"
+                violates = True
+            else:
+                status = "Within 10% tolerance"
+                violates = False
+    else:
+        status = "Unknown tolerance"
+        violates = False
+
+    return {"status": status, "difference": diff, "violates": violates}
+
+
+AMOUNTS = [None, 0.0, 90.0, 100.0, 105.0, 110.0, 110.01, 120.0]
+TOLERANCES = ["zero", "ten_percent", "unlimited", "other", None]
+
+
+@pytest.mark.parametrize("tolerance", TOLERANCES + ["<absent>"])
+def test_vectorized_statuses_match_reference(tolerance):
+    fees = []
+    for le_amount, cd_amount in product(AMOUNTS, AMOUNTS):
+        fee = {"le_amount": le_amount, "cd_amount": cd_amount}
+        if tolerance != "<absent>":
+            fee["tolerance_category"] = tolerance
+        fees.append(fee)
+
+    expected = [
+        compute_status_and_diff(
+            fee["le_amount"], fee["cd_amount"], fee.get("tolerance_category", "unlimited")
+        )
+        for fee in fees
+    ]
+    assert compute_fee_statuses(fees) == expected
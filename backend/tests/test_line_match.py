@@ -0,0 +1,233 @@
+"""The batched line matcher must score exactly like the per-line reference below."""
+
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytest
+from rapidfuzz import fuzz
+
+from fintrid_backend.main import (
+    _build_line_table,
+    _find_best_line_match_batched,
+    _fuzzy_score_rows,
+    _normalize_amount_digits,
+)
+from fintrid_backend.pdf_layout import (
+    _cluster_words_into_lines,
+    _normalize_for_fuzz,
+    _tokenize_text,
+)
+
+
+def _score_line_for_targets(
+    line: Dict[str, Any],
+    primary_targets: List[str],
+    secondary_targets: List[str],
+    amount_digits: Optional[str],
+    *,
+    page_width: Optional[float] = None,
+    row_hint: Optional[str] = None,
+    section_hint: Optional[str] = None,
+    page_section_ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+) -> float:
+    score = 0.0
+    fuzzy_text = line.get("fuzzy_text", "")
+
+    for target in primary_targets:
+        norm_target = _normalize_for_fuzz(target)
+        if not norm_target:
+            continue
+        ratio = fuzz.partial_ratio(norm_target, fuzzy_text)
+        if ratio > score:
+            score = ratio
+
+        target_tokens = _tokenize_text(target)
+        if target_tokens and line.get("tokens"):
+            token_hits = sum(1 for token in target_tokens if token in line["tokens"])
+            if token_hits:
+                score += min(20, token_hits * 6)
+
+    for secondary in secondary_targets:
+        norm_secondary = _normalize_for_fuzz(secondary)
+        if not norm_secondary:
+            continue
+        ratio = fuzz.partial_ratio(norm_secondary, fuzzy_text)
+        score = max(score, ratio * 0.85)
+
+    if amount_digits and amount_digits in (line.get("digits") or ""):
+        score += 25
+        if page_width and page_width > 0:
+            right_ratio = (line.get("x1", 0.0) / page_width) if page_width else 0.0
+            if right_ratio >= 0.7:
+                score += 12
+
+    if row_hint and row_hint in line.get("tokens", ()):
+        score += 10
+
+    if section_hint and page_section_ranges:
+        rng = page_section_ranges.get(section_hint.upper())
+        mid = line.get("mid_y")
+        if rng and mid is not None:
+            if rng[0] - 6 <= mid <= rng[1] + 6:
+                score += 12
+            else:
+                score -= 12
+
+    # penalty if no primary match context
+    if score < 50 and not amount_digits:
+        score *= 0.8
+
+    return score
+
+
+def _find_best_line_match(
+    pages: List[Dict[str, Any]],
+    primary_targets: List[str],
+    secondary_targets: List[str],
+    amount_digits: Optional[str],
+    *,
+    section_hint: Optional[str] = None,
+    row_hint: Optional[str] = None,
+    min_score: float = 60.0,
+) -> Optional[Dict[str, Any]]:
+    best: Optional[Dict[str, Any]] = None
+    for page in pages:
+        for line in page["lines"]:
+            if not line.get("norm_text"):
+                continue
+            score = _score_line_for_targets(
+                line,
+                primary_targets,
+                secondary_targets,
+                amount_digits,
+                page_width=page.get("width"),
+                row_hint=row_hint,
+                section_hint=section_hint,
+                page_section_ranges=page.get("section_ranges"),
+            )
+            if score < min_score:
+                continue
+            if best is None or score > best["score"]:
+                best = {"score": score, "page_index": page["index"], "line": line, "page": page}
+    return best
+
+
+ROWS = [
+    # (page, top, left-hand text, amount)
+    (0, 100, "A. Origination Charges", "$1,237.50"),
+    (0, 115, "01 0.25 % of Loan Amount (Points)", "$237.50"),
+    (0, 130, "02 Application Fee", "$500.00"),
+    (0, 145, "03 Underwriting Fee", "$500.00"),
+    (0, 175, "B. Services You Cannot Shop For", "$1,162.50"),
+    (0, 190, "01 Appraisal Fee to ABC Appraisers", "$650.00"),
+    (0, 205, "02 Credit Report Fee to XYZ Credit", "$512.50"),
+    (0, 235, "C. Services You Can Shop For", "$2,062.50"),
+    (0, 250, "01 Pest Inspection Fee to Bugs Inc.", "$125.00"),
+    (0, 265, "02 Survey Fee to Surveys Co.", "$1,062.50"),
+    (0, 280, "03 Title - Settlement Agent Fee", "$875.00"),
+    (1, 100, "E. Taxes and Other Government Fees", "$2,812.50"),
+    (1, 115, "01 Recording Fees and Other Taxes", "$1,337.50"),
+    (1, 130, "02 Transfer Taxes", "$1,475.00"),
+    (1, 160, "H. Other", "$1,887.50"),
+    (1, 175, "01 Home Warranty to Warranty Co.", "$1,887.50"),
+    (1, 190, "02 Title - Owner's Title Insurance (optional)", "$650.00"),
+]
+PAGE_WIDTH, PAGE_HEIGHT = 612.0, 792.0
+
+
+def _pages() -> List[Dict[str, Any]]:
+    pages = []
+    for index in range(2):
+        words = []
+        for page, top, text, amount in ROWS:
+            if page != index:
+                continue
+            x = 40.0
+            for token in text.split():
+                x1 = x + 6 * len(token)
+                words.append({"text": token, "x0": x, "x1": x1, "top": top, "bottom": top + 9})
+                x = x1 + 4
+            words.append(
+                {"text": amount, "x0": 500.0, "x1": 560.0, "top": top, "bottom": top + 9}
+            )
+        lines = _cluster_words_into_lines(words)
+        headers = [
+            (text[0], top) for page, top, text, _ in ROWS if page == index and text[1] == "."
+        ]
+        section_ranges = {
+            letter: (top, headers[i + 1][1] if i + 1 < len(headers) else PAGE_HEIGHT)
+            for i, (letter, top) in enumerate(headers)
+        }
+        pages.append(
+            {
+                "index": index,
+                "width": PAGE_WIDTH,
+                "height": PAGE_HEIGHT,
+                "lines": lines,
+                "section_ranges": section_ranges,
+            }
+        )
+    return pages
+
+
+REQUESTS = [
+    {"label": "02 Application Fee", "section": "A", "amount": 500.0, "row_hint": "02"},
+    {
+        "label": "Appraisal Fee",
+        "provider_name": "ABC Appraisers",
+        "section": "B",
+        "amount": 650.0,
+        "tolerance_category": "zero",
+    },
+    {"label": "Credit Report", "section": "B", "amount": None},
+    {"label": "Survey Fee", "section": "C", "amount": 1000.0, "tolerance_category": "ten_percent"},
+    {"label": "Recording Fees", "section": "E", "amount": 1337.5, "row_hint": "01"},
+    {"label": "Transfer Taxes", "section": "e", "amount": 1475.0},
+    {"label": "Owner's Title Insurance", "section": "H", "amount": 650.0},
+    {"label": "Home Warranty", "section": "H", "amount": None, "row_hint": "01"},
+    {"label": "Flood Certification", "section": "B", "amount": 30.0},
+    {"label": "Lender Credits", "section": "J", "amount": None},
+    {"label": "", "fee_name": "Pest Inspection", "section": "C", "amount": 125.0},
+]
+
+
+def _targets(request):
+    primary = [t for t in (request.get("label"), request.get("fee_name")) if t]
+    secondary = [
+        t
+        for t in (
+            request.get("provider_name"),
+            f"section {request.get('section')}" if request.get("section") else "",
+            request.get("section"),
+            request.get("tolerance_category"),
+        )
+        if t
+    ]
+    return primary, secondary
+
+
+@pytest.mark.parametrize("min_score", [60.0, 35.0])
+@pytest.mark.parametrize("request_", REQUESTS, ids=lambda r: r.get("label") or r["fee_name"])
+def test_batched_matcher_agrees_with_reference(request_, min_score):
+    pages = _pages()
+    table = _build_line_table(pages)
+    primary, secondary = _targets(request_)
+    ratio_rows = _fuzzy_score_rows(table, [_normalize_for_fuzz(t) for t in primary + secondary])
+    amount_digits = _normalize_amount_digits(request_.get("amount"))
+    kwargs = dict(
+        section_hint=request_.get("section"),
+        row_hint=request_.get("row_hint"),
+        min_score=min_score,
+    )
+
+    expected = _find_best_line_match(pages, primary, secondary, amount_digits, **kwargs)
+    actual = _find_best_line_match_batched(
+        table, ratio_rows, primary, secondary, amount_digits, **kwargs
+    )
+
+    if expected is None:
+        assert actual is None
+    else:
+        assert actual is not None
+        assert actual["score"] == pytest.approx(expected["score"])
+        assert actual["page_index"] == expected["page_index"]
+        assert actual["line"] is expected["line"]